@@ -1,10 +1,26 @@
+import asyncio
+import atexit
+import collections
+import contextlib
+import functools
+import hashlib
+import importlib.util
+import json
+import os
 import requests
-from datetime import datetime
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from datetime import datetime, timedelta
+import lxml.etree
+import lxml.html
 import numpy as np
 import time
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlencode, parse_qsl
 import re
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from types import MappingProxyType
 from typing import Dict, Any
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -14,6 +30,450 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import Select
 from selenium.webdriver.common.action_chains import ActionChains
+from selenium.common.exceptions import TimeoutException, SessionNotCreatedException
+from . import _parse
+
+try:
+    import requests_cache
+except ImportError:
+    requests_cache = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+IRI_BASE_URL = "https://kauai.ccmc.gsfc.nasa.gov/instantrun/iri/"
+_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.0 Safari/605.1.15',
+    'Referer': IRI_BASE_URL,
+    'Accept-Encoding': 'gzip, deflate',
+}
+
+# 呼び出しごとに作り直さないよう、正規表現・対応表・XPath は import 時に作る
+# 結果ページのダウンロードリンク: 文字列に download / raw output / view raw を含むか、
+# href が .txt / .out で終わる・/data/ や output を含む <a>（判定は libxml2 側で行う）
+_UPPER = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_LOWER = "abcdefghijklmnopqrstuvwxyz"
+_DL_XPATH = lxml.etree.XPath(
+    "//a[@href]["
+    f"contains(translate(., '{_UPPER}', '{_LOWER}'), 'download')"
+    f" or contains(translate(., '{_UPPER}', '{_LOWER}'), 'raw output')"
+    f" or contains(translate(., '{_UPPER}', '{_LOWER}'), 'view raw')"
+    " or substring(@href, string-length(@href) - 3) = '.txt'"
+    " or substring(@href, string-length(@href) - 3) = '.out'"
+    " or contains(@href, '/data/')"
+    f" or contains(translate(@href, '{_UPPER}', '{_LOWER}'), 'output')"
+    "]/@href"
+)
+# runID は結果ページの先頭付近に出るので、生の bytes の先頭 _RUNID_SCAN_BYTES だけを探す
+_RUNID_RE = re.compile(rb"runID=([A-Za-z0-9_\-]+)")
+_RUNID_SCAN_BYTES = 65536
+_TIME_TYPE_MAP = MappingProxyType({
+    'utc': '0',
+    'coordinate universal time (utc)': '0',
+    'universal': '0',
+    'local': '1',
+    'lt': '1',
+})
+_COORD_TYPE_MAP = MappingProxyType({
+    'geog': '0',
+    'geographic': '0',
+    'geodetic': '0',
+    'geocentric': '0',
+    'geom': '1',
+    'geomagnetic': '1',
+    'magnetic': '1',
+})
+# HTML は BeautifulSoup を介さず lxml (C 実装) で直接パースする
+_FORM_XPATH = lxml.etree.XPath("(//form)[1]")
+_COORD_TEXT_MAP = MappingProxyType({
+    "geom": "Geomagnetic",
+    "geog": "Geographic",
+    "geomagnetic": "Geomagnetic",
+    "geographic": "Geographic",
+})
+
+
+def _model_xpath(model_version):
+    """モデル選択ラジオボタンの XPath（"2020" と "IRI 2020" の両方にマッチ）"""
+    return f"//input[@type='radio' and (contains(@value, '{model_version.replace('IRI', '').strip()}') or contains(@value, '{model_version.strip()}'))]"
+
+
+# 既知のモデルは CSS セレクタで直接ラジオボタンを指定する（XPath で DOM 全体を走査しない）
+_MODEL_SELECTOR = MappingProxyType({
+    v: f"input[type='radio'][value*='{v.replace('IRI', '').strip()}']"
+    for v in ("IRI 2020", "IRI 2016", "IRI 2012", "IRI 2007")
+})
+_CLICK_JS = """
+const el = document.querySelector(arguments[0]);
+if (el) { el.click(); return true; }
+return false;
+"""
+
+# requests-cache による HTTP キャッシュ (同一パラメータの再実行をローカルで返す)
+_CACHE_NAME = "iri_cache"
+_CACHE_EXPIRE = timedelta(days=30)
+
+# 出力ファイルそのもののキャッシュ（同一パラメータなら通信せずに書き出す）
+_RESULT_CACHE_DIR = os.path.expanduser("~/.cache/iri_model")
+_RESULT_CACHE_EXPIRE = _CACHE_EXPIRE.total_seconds()
+# 読んだ結果ファイルのメモリ上の控え {key: (更新時刻, 中身)}（最近使った _RESULT_MEMO_SIZE 件まで）
+_RESULT_MEMO = collections.OrderedDict()
+_RESULT_MEMO_SIZE = 256
+_RESULT_MEMO_LOCK = threading.Lock()
+
+# モジュール共通のセッション（keep-alive で TCP/TLS 接続を呼び出し間で使い回す）
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+# フォーム情報のキャッシュ {base url: (取得時刻, meta)}
+_FORM_CACHE = {}
+_FORM_CACHE_TTL = 3600
+_FORM_CACHE_LOCK = threading.Lock()
+# 一度取得したフォーム情報（送信先・隠しフィールド・out_vars）を保存しておき、
+# 次のプロセスからはフォームページの GET を省略する（CSRF トークンがあるフォームは保存しない）
+_STATIC_FORM_FILE = os.path.join(_RESULT_CACHE_DIR, "form.json")
+_STATIC_FORM = None
+_TOKEN_WORDS = ("csrf", "token", "authenticity", "nonce")
+
+# Selenium で一度学習した XHR エンドポイント（以降はブラウザなしで直接叩く）
+_IRI_HOST = "https://kauai.ccmc.gsfc.nasa.gov"
+_ENDPOINT_FILE = os.path.join(_RESULT_CACHE_DIR, "endpoint.json")
+_ENDPOINT = None
+# フォームが JS 専用の場合に、従来形式のペイロードを直接 POST する送信先（既知ならば環境変数で指定）
+_IRI_REAL_ENDPOINT = os.environ.get("IRI_REAL_ENDPOINT")
+
+# CCMC へ同時に投げるリクエスト数の上限（レート制限対策）
+_HOST_SEMAPHORE = threading.Semaphore(8)
+
+# 接続タイムアウトは読み込みタイムアウトとは別に短くする（応答しないホストを早く諦める）
+_CONNECT_TIMEOUT = 3.05
+# Selenium のページ読み込み・スクリプト実行のタイムアウト上限
+_PAGE_LOAD_TIMEOUT_MAX = 60
+_SCRIPT_TIMEOUT = 10
+
+# 非同期版 (httpx) の接続数上限。HTTP/2 は h2 がインストールされている場合のみ使う
+_ASYNC_MAX_CONNECTIONS = 64
+_ASYNC_HTTP2 = importlib.util.find_spec("h2") is not None
+# run_iri_profile / getdata の transport に指定できる値
+_TRANSPORTS = ("requests", "httpx")
+_OUT_VARS_DEFAULT = ('1', '2', '3', '4', '5', '6', '7', '8', '9', '10')
+# 入力値によって変わるフォームの項目（結果キャッシュのキーにもなる）
+_PAYLOAD_KEYS = (
+    'Year', 'Month', 'Day', 'Hour', 'Minute', 'Second',
+    'Longitude', 'Latitude', 'min_alt', 'max_alt', 'step_alt',
+)
+
+
+def _cacheable_response(response):
+    """
+    requests-cache に保存してよい応答か。
+    フォームページ（TTL 付きで取り直すため）と、結果（ダウンロードリンク・出力・runID）を含まない
+    HTML の応答は保存しない（失敗した送信の応答を30日間再生し続けないように）。
+    """
+    request = response.request
+    if request.method == "GET" and request.url == IRI_BASE_URL:
+        return False
+    if "html" not in response.headers.get("Content-Type", "").lower():
+        return True
+    content = response.content
+    return bool(
+        _parse.find_download_link(content)
+        or _parse.find_inline_output(content)
+        or _RUNID_RE.search(content)
+    )
+
+
+def _new_session(use_cache=True, pool_connections=32, pool_maxsize=64) -> requests.Session:
+    """
+    IRI 用の requests セッションを作成する。
+    use_cache=True かつ requests-cache が使える場合は SQLite キャッシュ付きセッションを返す
+    （保存するのは _cacheable_response が許した応答だけ）。
+    接続するホストは CCMC だけなので、逐次実行なら pool_connections=1 で十分。
+    """
+    if use_cache and requests_cache is not None:
+        session = requests_cache.CachedSession(
+            _CACHE_NAME,
+            backend="sqlite",
+            use_cache_dir=True,
+            expire_after=_CACHE_EXPIRE,
+            allowable_methods=["GET", "POST"],
+            match_headers=False,
+            filter_fn=_cacheable_response,
+        )
+        # 以前のバージョンが保存したフォームページは捨てる（フォーム情報は _FORM_CACHE の TTL で管理する）
+        try:
+            session.cache.delete(urls=[IRI_BASE_URL])
+        except Exception:
+            pass
+    else:
+        session = requests.Session()
+    # 接続プールを広げ、一時的な 5xx は urllib3 側でバックオフ付きリトライする
+    # （フォーム送信の POST も同じ入力で再送するだけなので、リトライの対象に含める）
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.5,
+            status_forcelist=[500, 502, 503, 504],
+            allowed_methods=frozenset(["GET", "POST"]),
+        ),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(_HEADERS)
+    return session
+
+
+def _get_session() -> requests.Session:
+    """
+    モジュール共通のセッションを返す（初回に作成）。
+    requests-cache が使える場合はキャッシュ付き。
+    Cookie はスレッドセーフでないので、並列実行ではワーカーごとに _new_session() を使う。
+    """
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = _new_session(use_cache=True)
+        return _SESSION
+
+
+# Chrome 起動設定 (import 時に1度だけ作る)
+# eager: DOMContentLoaded で制御を返す（画像や外部スクリプトの読み込みを待たない）
+_CHROME_OPTIONS = Options()
+_CHROME_OPTIONS.page_load_strategy = "eager"
+_CHROME_OPTIONS.add_argument("--headless=new")
+_CHROME_OPTIONS.add_argument("--no-sandbox")
+_CHROME_OPTIONS.add_argument("--disable-gpu")
+_CHROME_OPTIONS.add_argument("--window-size=1920,1080")
+_CHROME_OPTIONS.add_argument("user-agent=Mozilla/5.0")
+_CHROME_OPTIONS.add_argument("--blink-settings=imagesEnabled=false")
+_CHROME_OPTIONS.add_argument("--disable-extensions")
+_CHROME_OPTIONS.add_argument("--disable-background-networking")
+_CHROME_OPTIONS.add_argument("--disable-features=Translate,BackForwardCache")
+# フォーム送信時の XHR を記録して直接叩けるようにするため、ネットワークログを取る
+_CHROME_OPTIONS.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+# React制御下の input 群に値を設定する。見つからなかった name のリストを返す。
+# arguments[0]: {name: value}, arguments[1]: {name: [候補の name, ...]}
+# name の要素が無ければ候補の name を順に試す（フィールド名の揺れを1回の呼び出しで吸収する）
+_FILL_JS = """
+const setter = Object.getOwnPropertyDescriptor(window.HTMLInputElement.prototype, 'value').set;
+const aliases = arguments[1];
+const missing = [];
+for (const [name, val] of Object.entries(arguments[0])) {
+    let els = [];
+    for (const n of [name].concat(aliases[name] || [])) {
+        els = document.getElementsByName(n);
+        if (els.length) break;
+    }
+    if (!els.length) { missing.push(name); continue; }
+    for (const el of els) {
+        setter.call(el, val);
+        el.dispatchEvent(new Event('input', { bubbles: true }));
+        el.dispatchEvent(new Event('change', { bubbles: true }));
+    }
+}
+return missing;
+"""
+# フォームの input name の候補（旧実装で試していた name）
+_FIELD_ALIASES = {
+    "lat": ["Latitude", "latitude"],
+    "lon": ["Longitude", "longitude"],
+    "start": ["min_alt", "minAlt", "height_start"],
+    "stop": ["max_alt", "maxAlt", "height_stop"],
+    "step": ["step_alt", "stepAlt"],
+    "datetime": ["DateTime", "date_time"],
+}
+# フォームの描画完了の判定に使う、緯度の入力欄のセレクタ（_FILL_JS と同じ候補）
+_LAT_FIELD_CSS = ", ".join(f"[name='{name}']" for name in ["lat"] + _FIELD_ALIASES["lat"])
+
+# 結果タブのリンク: まず href だけで探し（chromedriver 側で安価）、無ければ文字列で探す (_RAW_LINK_JS)
+_RAW_LINK_XPATH = "//a[contains(@href,'output_') or contains(@href,'.txt') or contains(@href,'download')]"
+_RESULT_XPATH = "//a[contains(., 'Raw Output') or contains(., 'Results') or contains(., 'Download')]"
+# 結果ページの "Raw Output" / "Download" リンクの絶対 URL を返す（無ければ null）
+_RAW_LINK_JS = """
+const a = Array.from(document.querySelectorAll('a[href]'))
+    .find(e => /Raw Output|Download/i.test(e.textContent));
+return a ? a.href : null;
+"""
+
+# Chrome の起動は数秒かかるので、ドライバはリトライ間・呼び出し間で使い回す
+# WebDriver はスレッド間で共有できないので、スレッドごとに1つ持つ {thread ident: driver}
+# (Service は driver.quit() で停止されるため、ドライバごとに作る)
+_DRIVERS = {}
+_DRIVER_LOCK = threading.Lock()
+_DRIVER_PATH = None
+
+
+# CDP でブロックする URL パターン（画像・フォント・解析系など結果取得に不要なもの）
+# CSS は kauai.ccmc.gsfc.nasa.gov 自身のものも塞いでしまうのでブロックしない
+_BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf",
+    "*google-analytics*", "*googletagmanager*", "*fonts.googleapis*", "*fonts.gstatic*",
+]
+
+
+def _new_driver() -> webdriver.Chrome:
+    """Chrome を起動し、不要なリソースの読み込みを CDP でブロックする。"""
+    global _DRIVER_PATH
+    if _DRIVER_PATH is None:
+        driver = webdriver.Chrome(service=Service(), options=_CHROME_OPTIONS)
+    else:
+        try:
+            driver = webdriver.Chrome(service=Service(executable_path=_DRIVER_PATH), options=_CHROME_OPTIONS)
+        except SessionNotCreatedException:
+            # Chrome の更新などでバージョンがずれた場合は chromedriver を解決し直す
+            _DRIVER_PATH = None
+            driver = webdriver.Chrome(service=Service(), options=_CHROME_OPTIONS)
+    # Selenium Manager が解決した chromedriver のパスを覚えておき、次回からの解決処理を省く
+    _DRIVER_PATH = driver.service.path
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": _BLOCKED_URLS})
+    except Exception:
+        pass
+    return driver
+
+
+def _get_driver() -> webdriver.Chrome:
+    """現在のスレッドの Chrome ドライバを返す（未起動なら起動する）。"""
+    ident = threading.get_ident()
+    with _DRIVER_LOCK:
+        driver = _DRIVERS.get(ident)
+    if driver is None:
+        driver = _new_driver()
+        with _DRIVER_LOCK:
+            _DRIVERS[ident] = driver
+    return driver
+
+
+def _quit_driver(ident=None):
+    """指定スレッド（省略時は現在のスレッド）の Chrome ドライバを終了する。"""
+    if ident is None:
+        ident = threading.get_ident()
+    with _DRIVER_LOCK:
+        driver = _DRIVERS.pop(ident, None)
+    if driver is not None:
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+
+def _quit_all_drivers():
+    """起動中の全ての Chrome ドライバを終了する（インタプリタ終了時にも呼ばれる）。"""
+    with _DRIVER_LOCK:
+        idents = list(_DRIVERS)
+    for ident in idents:
+        _quit_driver(ident)
+
+
+atexit.register(_quit_all_drivers)
+
+
+def _reset_driver(driver):
+    """次の呼び出しに備えて、ドライバを終了せずに Cookie とページだけ破棄する。"""
+    try:
+        driver.delete_all_cookies()
+        driver.get("about:blank")
+    except Exception:
+        pass
+
+
+def _form_values(date_time, longitude, latitude, min_alt, max_alt, step_alt):
+    """フォームの input name -> 入力値（文字列）の dict を作る。"""
+    lat_val, lon_val, min_alt_val, max_alt_val, step_alt_val = _clamp_coords(
+        latitude, longitude, min_alt, max_alt, step_alt
+    )
+    return {
+        "lat": f"{lat_val:.6f}",
+        "lon": f"{lon_val:.6f}",
+        "start": f"{min_alt_val:.1f}",
+        "stop": f"{max_alt_val:.1f}",
+        "step": f"{step_alt_val:.1f}",
+        "datetime": date_time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def _write_json(path, obj):
+    """
+    obj を JSON で path に保存する。一時ファイルに書いてから os.replace で置くので、
+    途中まで書かれたファイルが読まれることはない。失敗したら（例外は投げず）False。
+    """
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(obj, f, indent=2)
+        os.replace(tmp, path)
+        return True
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return False
+
+
+def _learn_endpoint(driver, values, model_version, time_type, coord_type, info=True):
+    """
+    ネットワークログから、フォーム送信で発行された CCMC への POST
+    （レスポンスに runID を含むもの）を探し、URL・ヘッダ・ボディを _ENDPOINT_FILE に保存する。
+    """
+    global _ENDPOINT
+    try:
+        entries = driver.get_log("performance")
+    except Exception:
+        return
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+            if message.get("method") != "Network.requestWillBeSent":
+                continue
+            request = message["params"]["request"]
+            if request.get("method") != "POST" or not request["url"].startswith(_IRI_HOST):
+                continue
+            body = driver.execute_cdp_cmd(
+                "Network.getResponseBody", {"requestId": message["params"]["requestId"]}
+            )
+        except Exception:
+            continue
+        if "runID" not in body.get("body", ""):
+            continue
+        post_data = request.get("postData", "")
+        # 入力値がボディのどこに入っているかを記録しておく（全て見つからなければ再送できないので記録しない）
+        fields = _map_post_fields(post_data, values)
+        if fields is None:
+            if info: print("  [warn] Input values not found in the IRI request body. Endpoint not learned.")
+            return
+        endpoint = {
+            "url": request["url"],
+            "headers": {
+                k: v for k, v in request.get("headers", {}).items()
+                if k.lower() not in ("cookie", "content-length")
+            },
+            "post_data": post_data,
+            "values": values,
+            "fields": fields,
+            "model_version": model_version,
+            "time_type": time_type,
+            "coord_type": coord_type,
+        }
+        if not _write_json(_ENDPOINT_FILE, endpoint):
+            if info: print(f"  [warn] Failed to save the IRI endpoint to {_ENDPOINT_FILE}")
+        _ENDPOINT = endpoint
+        if info: print(f"✔ Learned IRI endpoint: {request['url']}")
+        return
 
 
 def _run_iri_profile_selenium(
@@ -24,86 +484,68 @@ def _run_iri_profile_selenium(
     max_alt: float,
     step_alt: float,
     model_version: str,
-    output_filename: str,
     timeout: float = 60.0,
     time_type="UTC",
     coord_type="Geomagnetic",
     info=True,
-) -> int:
+    driver=None,
+    learn_endpoint=False,
+):
     """
     IRIモデルを実行（Selenium）。
-    成功したら 0, 失敗したら 1 を返す。
+    driver を渡した場合はそれを使い回し（終了しない）、None の場合は新しく起動して最後に終了する。
+    learn_endpoint=True なら、フォーム送信時の XHR を _ENDPOINT_FILE に記録する。
+    成功したら出力テキストの bytes, 失敗したら None を返す。
     """
-    IRI_BASE_URL = "https://kauai.ccmc.gsfc.nasa.gov/instantrun/iri/"
     if info:
         print("\n--- Downloading IRI model ---")
 
-    driver = None
+    own_driver = driver is None
     try:
-        # 座標補正
-        if latitude < -90: latitude = -90
-        if latitude > 90: latitude = 90
-        if longitude < 0: longitude += 360
-        if longitude > 360: longitude = longitude % 360
-
-        # Chrome 起動設定
-        opts = Options()
-        opts.add_argument("--headless=new")
-        opts.add_argument("--no-sandbox")
-        opts.add_argument("--disable-gpu")
-        opts.add_argument("--window-size=1920,1080")
-        opts.add_argument("user-agent=Mozilla/5.0")
-
-        service = Service()
-        driver = webdriver.Chrome(service=service, options=opts)
+        if own_driver:
+            driver = _new_driver()
+        else:
+            driver.delete_all_cookies()
+        if learn_endpoint:
+            # 前回までのネットワークログを捨てる
+            driver.get_log("performance")
         wait = WebDriverWait(driver, 40)
-        driver.set_page_load_timeout(timeout)
-        driver.get(IRI_BASE_URL)
+        driver.set_page_load_timeout(min(timeout, _PAGE_LOAD_TIMEOUT_MAX))
+        driver.set_script_timeout(_SCRIPT_TIMEOUT)
+        try:
+            driver.get(IRI_BASE_URL)
+        except TimeoutException:
+            # 遅いサブリソースで読み込みが終わらなくても、フォームが出ていれば続行する
+            driver.execute_script("window.stop();")
+        # eager なので React がフォームを描画するまで明示的に待つ
+        # （入力欄の name は別名の場合もあるので、どれか1つが現れれば進む）
+        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, _LAT_FIELD_CSS)))
 
         # --- 各項目を入力 ---
         if info:
             print("--- inputing parameters ---")
         
-        # 値の補正（入力用）
-        lat_val = max(-89.9, min(89.9, latitude))
-        lon_val = longitude % 360
-        min_alt_val = max(0, min(2000, min_alt))
-        max_alt_val = max(0, min(2000, max_alt))
-        step_alt_val = max(1, min(500, step_alt))
-
-        def safe_fill(name, value):
-            """React制御下のinputへの値設定と表示"""
-            el = driver.find_element(By.NAME, name)
-            driver.execute_script("""
-                const el = arguments[0];
-                const value = arguments[1];
-                const nativeInputValueSetter = Object.getOwnPropertyDescriptor(window.HTMLInputElement.prototype, 'value').set;
-                nativeInputValueSetter.call(el, value);
-                el.dispatchEvent(new Event('input', { bubbles: true }));
-                el.dispatchEvent(new Event('change', { bubbles: true }));
-            """, el, str(value))
-            if info:
+        # React制御下のinputへの値設定（1回の execute_script でまとめて入力）
+        values = _form_values(date_time, longitude, latitude, min_alt, max_alt, step_alt)
+        missing = driver.execute_script(_FILL_JS, values, _FIELD_ALIASES)
+        if missing:
+            raise ValueError(f"input fields not found: {missing}")
+        if info:
+            for name, value in values.items():
                 print(f"  {name} = {value}")
 
-        safe_fill("lat", f"{lat_val:.6f}")
-        safe_fill("lon", f"{lon_val:.6f}")
-        safe_fill("start", f"{min_alt_val:.1f}")
-        safe_fill("stop", f"{max_alt_val:.1f}")
-        safe_fill("step", f"{step_alt_val:.1f}")
-        safe_fill("datetime", date_time.strftime("%Y-%m-%dT%H:%M:%S"))
-
         # モデルバージョン
         try:
-            version_candidates = [
-                f"//input[@type='radio' and (contains(@value, '{model_version.replace('IRI', '').strip()}') or contains(@value, '{model_version.strip()}'))]"
-            ]
-            for xpath in version_candidates:
-                els = driver.find_elements(By.XPATH, xpath)
-                if els:
+            if model_version in _MODEL_SELECTOR:
+                clicked = driver.execute_script(_CLICK_JS, _MODEL_SELECTOR[model_version])
+            else:
+                els = driver.find_elements(By.XPATH, _model_xpath(model_version))
+                clicked = bool(els)
+                if clicked:
                     driver.execute_script("arguments[0].click();", els[0])
-                    if info:
-                        print(f"  model = {model_version}")
-                    break
+            if clicked:
+                if info:
+                    print(f"  model = {model_version}")
             else:
                 if info: print("  [warn] Error in selecting model")
         except Exception as e:
@@ -114,38 +556,37 @@ def _run_iri_profile_selenium(
             Select(driver.find_element(By.NAME, "timeType")).select_by_visible_text("Coordinated Universal Time (UTC)")
             if info: print("  time type = UTC")
             
-            coord_text_map = {"geom": "Geomagnetic", "geog": "Geographic", "geomagnetic": "Geomagnetic", "geographic": "Geographic"}
-            coord_text = coord_text_map.get(coord_type.lower(), "Geomagnetic")
+            coord_text = _COORD_TEXT_MAP.get(coord_type.lower(), "Geomagnetic")
             Select(driver.find_element(By.NAME, "coordinateType")).select_by_visible_text(coord_text)
             if info: print(f"  coordinate = {coord_text}")
         except Exception:
             if info: print("  [warn] Error in selecting time or coordinate types")
 
-        # Reactエラーチェック
-        for _ in range(10):
-            if not driver.find_elements(By.CLASS_NAME, "common_errorText__MGmlx"):
-                if info: print("✔ All input parameters are valid.")
-                break
-            time.sleep(0.5)
-
-        # Submit監視
+        # Reactエラーチェック（エラー表示が消えた時点ですぐ抜ける）
+        try:
+            WebDriverWait(driver, 5, poll_frequency=0.1).until_not(
+                EC.presence_of_element_located((By.CLASS_NAME, "common_errorText__MGmlx"))
+            )
+            if info: print("✔ All input parameters are valid.")
+        except TimeoutException:
+            pass
+
+        # Submit監視（disabled が外れた時点ですぐクリック）
         if info: print("--- Monitoring Submit Button ---")
-        for i in range(30):
-            btn = driver.find_element(By.CSS_SELECTOR, "button[type='submit']")
-            if not btn.get_attribute("disabled"):
-                if info: print(f"✔ Submit button enabled (after {i}s). Clicking...")
-                btn.click()
-                break
-            time.sleep(1)
-        else:
+        t0 = time.time()
+        try:
+            WebDriverWait(driver, 30, poll_frequency=0.1).until(
+                lambda d: not d.find_element(By.CSS_SELECTOR, "button[type='submit']").get_attribute("disabled")
+            )
+            if info: print(f"✔ Submit button enabled (after {time.time() - t0:.1f}s). Clicking...")
+            driver.find_element(By.CSS_SELECTOR, "button[type='submit']").click()
+        except TimeoutException:
             if info: print("  [warn] Submit button timeout. Forcing submit via JS.")
             driver.execute_script("document.querySelector('form').dispatchEvent(new Event('submit', { bubbles: true }));")
 
         # 結果ページ待機
         if info: print("✔ Form submitted. Waiting for results...")
-        WebDriverWait(driver, 60).until(
-            EC.presence_of_element_located((By.XPATH, "//a[contains(., 'Raw Output') or contains(., 'Results') or contains(., 'Download')]"))
-        )
+        WebDriverWait(driver, 60).until(EC.presence_of_element_located((By.XPATH, _RESULT_XPATH)))
 
         # Resultsタブ表示
         driver.execute_script("""
@@ -153,41 +594,864 @@ def _run_iri_profile_selenium(
                 .find(e => e.textContent.match(/Results|Output/i));
             if (resultsTab) resultsTab.click();
         """)
-        time.sleep(2)
-
-        # BeautifulSoup で解析
-        page_source = driver.page_source
-        soup = BeautifulSoup(page_source, "html.parser")
-
-        # 保存判定
-        link = soup.find("a", string=re.compile("Raw Output|Download", re.I))
-        if link and link.get("href"):
-            data_url = urljoin(IRI_BASE_URL, link["href"])
+        # 固定の sleep ではなく、リンクか <pre> が現れた時点で次に進む
+        try:
+            WebDriverWait(driver, 10, poll_frequency=0.1).until(EC.any_of(
+                EC.presence_of_element_located((By.XPATH, _RAW_LINK_XPATH)),
+                EC.presence_of_element_located((By.TAG_NAME, "pre")),
+            ))
+        except TimeoutException:
+            # href で見つからなければ、リンクの文字列で探す
+            try:
+                WebDriverWait(driver, 10, poll_frequency=0.1).until(lambda d: d.execute_script(_RAW_LINK_JS))
+            except TimeoutException:
+                pass
+
+        # 保存判定（page_source 全体を転送せず、ブラウザ内でリンクの href だけ取り出す）
+        links = driver.find_elements(By.XPATH, _RAW_LINK_XPATH)
+        data_url = links[0].get_attribute("href") if links else driver.execute_script(_RAW_LINK_JS)
+        if data_url:
+            data_url = urljoin(IRI_BASE_URL, data_url)
             if info: print(f"Downloading data from: {data_url}")
-            r = requests.get(data_url, timeout=60)
-            r.raise_for_status()
-            with open(output_filename, "w", encoding="utf-8") as f:
-                f.write(r.text)
-            if info: print(f"✔ Success: Saved to '{output_filename}'")
-            return 0
+            content = _download(data_url, timeout=60)
+            if info: print("✔ Success")
         else:
-            pre = soup.find("pre")
-            if pre and len(pre.text.strip()) > 100:
-                with open(output_filename, "w", encoding="utf-8") as f:
-                    f.write(pre.text)
-                if info: print(f"✔ Success: Saved to '{output_filename}' (via pre tag)")
-                return 0
+            # <pre> もブラウザ内で取り出す（textContent は lxml の text_content() と同じく空白をそのまま返す）
+            pres = driver.find_elements(By.TAG_NAME, "pre")
+            pre_text = (pres[0].get_attribute("textContent") or "") if pres else ""
+            if len(pre_text.strip()) > 100:
+                if info: print("✔ Success (via pre tag)")
+                content = pre_text.encode("utf-8")
             else:
                 if info: print("✘ Error: Result content not found.")
-                return 1
+                return None
+
+        # 結果が取れた場合だけ XHR を記録する（記録に失敗しても結果はそのまま返す）
+        if learn_endpoint:
+            _learn_endpoint(driver, values, model_version, time_type, coord_type, info=info)
+        return content
 
     except Exception as e:
         if info: print(f"✘ Exception in _run_iri_profile_selenium: {e}")
-        return 1
+        return None
     finally:
-        if driver:
+        if own_driver and driver:
             driver.quit()
 
+def _clamp_coords(lat, lon, min_alt=0, max_alt=2000.0, step_alt=50.0):
+    """
+    緯度・経度・高度をフォームが受け付ける範囲に補正する。
+    スカラーなら組み込みの min/max、NumPy 配列ならまとめて np.clip / np.mod で処理する。
+
+    Returns
+    -------
+    tuple
+        (lat, lon, min_alt, max_alt, step_alt)
+        lat: [-89.9, 89.9], lon: [0, 360), alt: [0, 2000] km, step: [1, 500] km
+    """
+    if np.ndim(lat) == 0 and np.ndim(lon) == 0:
+        return (
+            max(-89.9, min(89.9, lat)),
+            lon % 360.0,
+            max(0, min(2000, min_alt)),
+            max(0, min(2000, max_alt)),
+            max(1, min(500, step_alt)),
+        )
+    return (
+        np.clip(lat, -89.9, 89.9),
+        np.mod(lon, 360.0),
+        np.clip(min_alt, 0, 2000),
+        np.clip(max_alt, 0, 2000),
+        np.clip(step_alt, 1, 500),
+    )
+
+
+def _write_bytes(output_filename, data):
+    """data (bytes) を Python のテキスト層・バッファを通さずに output_filename へ書き込む。"""
+    fd = os.open(output_filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+
+
+def _download(url, timeout=60, session=None, connect_timeout=_CONNECT_TIMEOUT):
+    """
+    url の内容を bytes で返す。
+    session が None の場合は requests.get を使う。
+    """
+    get = requests.get if session is None else session.get
+    r = get(url, timeout=(connect_timeout, timeout))
+    r.raise_for_status()
+    # r.content は gzip などの Content-Encoding も展開済み
+    return r.content
+
+
+def _result_cache_key(values, model_version, time_type, coord_type):
+    """結果キャッシュのキー（送信するフォーム値 _payload_values の文字列のタプル）"""
+    return tuple(values[k] for k in _PAYLOAD_KEYS) + (
+        model_version, _translate_time_type(time_type), _translate_coord_type(coord_type),
+    )
+
+
+def _result_cache_path(key):
+    """キーを blake2b でハッシュした、ディスク上の結果キャッシュのパス"""
+    # キーは文字列のみなので、orjson と json のどちらでも同じバイト列になる
+    if orjson is not None:
+        raw = orjson.dumps(key)
+    else:
+        raw = json.dumps(key, separators=(",", ":")).encode()
+    return os.path.join(_RESULT_CACHE_DIR, hashlib.blake2b(raw, digest_size=16).hexdigest() + ".txt")
+
+
+def _cached_result(key) -> bytes:
+    """
+    キャッシュ済みの結果ファイルの中身を返す。無い・期限切れなら KeyError。
+    期限はメモリに残っているものも呼び出しごとに確かめる。
+    """
+    mtime, data = _read_cached_result(key)
+    if time.time() - mtime > _RESULT_CACHE_EXPIRE:
+        raise KeyError(key)
+    return data
+
+
+def _read_cached_result(key):
+    """
+    結果ファイルの (更新時刻, 中身) を返す。無い・IRI のデータ行を含まない（以前に保存された別のページ）なら KeyError。
+    読めたものだけ _RESULT_MEMO に控え、次からはファイルを読まない。
+    """
+    with _RESULT_MEMO_LOCK:
+        hit = _RESULT_MEMO.get(key)
+        if hit is not None:
+            _RESULT_MEMO.move_to_end(key)
+            return hit
+    path = _result_cache_path(key)
+    try:
+        mtime = os.path.getmtime(path)
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        raise KeyError(key) from None
+    if not _parse.has_data_rows(data):
+        raise KeyError(key)
+    with _RESULT_MEMO_LOCK:
+        _RESULT_MEMO[key] = (mtime, data)
+        _RESULT_MEMO.move_to_end(key)
+        while len(_RESULT_MEMO) > _RESULT_MEMO_SIZE:
+            _RESULT_MEMO.popitem(last=False)
+    return mtime, data
+
+
+def _store_cached_bytes(key, data):
+    """
+    取得した出力 (bytes) をディスクの結果キャッシュに保存する（失敗しても無視）。
+    IRI のデータ行を含まないもの（<pre> や runID の推定で拾った別のページなど）は保存しない。
+    """
+    if not _parse.has_data_rows(data):
+        return
+    _store_cache_entry(key, lambda tmp: _write_bytes(tmp, data))
+
+
+def _store_cache_entry(key, write):
+    """
+    write(一時ファイル名) で書いたものを os.replace でキャッシュに置く。
+    そのキーのメモリ上の控えは古い更新時刻を持っているので、保存したら捨てる（他のキーはそのまま）。
+    """
+    path = _result_cache_path(key)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(_RESULT_CACHE_DIR, exist_ok=True)
+        write(tmp)
+        os.replace(tmp, path)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+    with _RESULT_MEMO_LOCK:
+        _RESULT_MEMO.pop(key, None)
+
+
+@functools.lru_cache(maxsize=8)
+def _translate_time_type(v):
+    if v is None:
+        return ''
+    vs = str(v).strip().lower()
+    return _TIME_TYPE_MAP.get(vs, vs)
+
+
+@functools.lru_cache(maxsize=8)
+def _translate_coord_type(v):
+    if v is None:
+        return ''
+    vs = str(v).strip().lower()
+    return _COORD_TYPE_MAP.get(vs, vs)
+
+
+def _find_download_link(html_doc):
+    """lxml の文書からダウンロードリンクの href を返す。無ければ None。"""
+    hrefs = _DL_XPATH(html_doc)
+    return str(hrefs[0]) if hrefs else None
+
+
+def _runid_data_url(url, content):
+    """結果の URL またはページ先頭の runID= から出力ファイルの URL を推定する。無ければ None。"""
+    m = _RUNID_RE.search(url.encode()) or _RUNID_RE.search(content[:_RUNID_SCAN_BYTES])
+    if m is None:
+        return None
+    return urljoin(IRI_BASE_URL, f"data/output_{m.group(1).decode()}.txt")
+
+
+def _invalidate_form_meta(static=False):
+    """フォーム情報のキャッシュを捨てる（次の呼び出しで取り直す）。static=True なら保存済みのものも捨てる。"""
+    with _FORM_CACHE_LOCK:
+        _FORM_CACHE.pop(IRI_BASE_URL, None)
+    if static:
+        _invalidate_static_form()
+
+
+def _form_rejected(status_code, meta):
+    """フォーム送信の応答がフォーム情報の取り直しで直りそうな拒否 (403、保存済みの情報なら 4xx) か"""
+    if status_code == 403:
+        return True
+    return bool(meta.get("static")) and 400 <= status_code < 500
+
+
+def _load_static_form():
+    """保存済みのフォーム情報を返す。無ければ None。"""
+    global _STATIC_FORM
+    if _STATIC_FORM is None:
+        try:
+            with open(_STATIC_FORM_FILE, encoding="utf-8") as f:
+                _STATIC_FORM = json.load(f)
+        except (OSError, ValueError):
+            return None
+    return _STATIC_FORM
+
+
+def _save_static_form(meta):
+    """フォーム情報を _STATIC_FORM_FILE に保存する。隠しフィールドにトークンらしきものがあれば保存しない。"""
+    global _STATIC_FORM
+    if any(w in name.lower() for name in meta["hidden_inputs"] for w in _TOKEN_WORDS):
+        return
+    static = {k: meta[k] for k in ("submit_url", "form_method", "hidden_inputs", "out_vars_values")}
+    if static == _STATIC_FORM:
+        return
+    _STATIC_FORM = static
+    # 並行に呼ばれても途中まで書かれたファイルが残らないように、一時ファイルから置き換える
+    _write_json(_STATIC_FORM_FILE, static)
+
+
+def _invalidate_static_form():
+    """保存済みのフォーム情報を破棄する（次は必ずフォームページを取得する）。"""
+    global _STATIC_FORM
+    _STATIC_FORM = None
+    try:
+        os.remove(_STATIC_FORM_FILE)
+    except OSError:
+        pass
+
+
+def _static_form_meta():
+    """保存済みのフォーム情報をフォーム情報のキャッシュに載せて返す。無ければ None。"""
+    static = _load_static_form()
+    if static is None:
+        return None
+    meta = dict(static, cookies={}, static=True)
+    with _FORM_CACHE_LOCK:
+        _FORM_CACHE[IRI_BASE_URL] = (time.time(), meta)
+    return meta
+
+
+def _cached_form_meta():
+    """TTL 内のフォーム情報のキャッシュを (hit, meta) で返す。"""
+    with _FORM_CACHE_LOCK:
+        cached = _FORM_CACHE.get(IRI_BASE_URL)
+        if cached is not None and time.time() - cached[0] < _FORM_CACHE_TTL:
+            return True, cached[1]
+    return False, None
+
+
+def _store_form_meta(content, cookies, info=True, persist=True):
+    """
+    フォームページの HTML からフォーム情報を作り、キャッシュして返す。
+    persist=True なら _STATIC_FORM_FILE にも保存する（ネットワークから取得したページのときだけ）。
+    """
+    forms = _FORM_XPATH(lxml.html.fromstring(content))
+    form = forms[0] if forms else None
+    if form is None:
+        if info: print("  [warn] Form not found.")
+        meta = None
+    else:
+        meta = _parse_form(form, info=info)
+        if meta is not None:
+            if persist:
+                _save_static_form(meta)
+            meta["cookies"] = cookies
+
+    with _FORM_CACHE_LOCK:
+        _FORM_CACHE[IRI_BASE_URL] = (time.time(), meta)
+    return meta
+
+
+def _get_form_meta(
+    session, timeout=30.0, info=True, connect_timeout=_CONNECT_TIMEOUT, skip_warmup=False, refresh=False
+):
+    """
+    IRI_BASE_URL のフォーム情報（action, method, 隠しフィールド, out_vars）を返す。
+    ページはほぼ静的なので _FORM_CACHE_TTL 秒の間はキャッシュを返し、GET を省略する。
+    skip_warmup=True なら、キャッシュが無くても保存済みのフォーム情報があればそれを使う。
+    refresh=True なら、どのキャッシュ（requests-cache を含む）も使わずにページを取り直す。
+    フォームが無い・JS 専用の場合は None を返す（これもキャッシュする）。
+    """
+    hit, meta = (False, None) if refresh else _cached_form_meta()
+    if hit:
+        if meta is not None:
+            # 初回 GET で受け取った Cookie を引き継ぐ
+            session.cookies.update(meta["cookies"])
+        return meta
+    if skip_warmup and not refresh:
+        meta = _static_form_meta()
+        if meta is not None:
+            return meta
+
+    # 渡されたセッションがキャッシュ付きでも、取り直すときは保存済みの古いページを使わない
+    force = {"force_refresh": True} if refresh and hasattr(session, "cache") else {}
+    r0 = session.get(IRI_BASE_URL, timeout=(connect_timeout, timeout), **force)
+    r0.raise_for_status()
+    # キャッシュから返ったページ（古いかもしれない）は保存済みのフォーム情報にしない
+    return _store_form_meta(
+        r0.content, r0.cookies.get_dict(), info=info, persist=not getattr(r0, "from_cache", False)
+    )
+
+
+def _warmup(session=None, timeout=30.0, info=True, connect_timeout=_CONNECT_TIMEOUT, skip_warmup=True):
+    """
+    フォーム情報を先に取得してキャッシュしておく（多数の呼び出しを並行に始める前に1度だけ呼ぶ）。
+    並行に始めた各リクエストが、キャッシュが空のまま一斉にフォームページを GET するのを防ぐ。
+    session が None ならモジュール共通のものを使う。失敗しても例外は投げず None を返す
+    （各呼び出しはいつも通りフォーム情報を取りに行く）。
+    skip_warmup=True なら、保存済みのフォーム情報があれば GET もしない。
+    """
+    if session is None:
+        session = _get_session()
+    try:
+        return _get_form_meta(
+            session, timeout=timeout, info=info, connect_timeout=connect_timeout, skip_warmup=skip_warmup
+        )
+    except Exception as e:
+        if info: print(f"  [warn] Failed to fetch the IRI form: {e}")
+        return None
+
+
+def _parse_form(form, info=True):
+    """lxml の form 要素からフォーム情報の dict を作る。JS 専用なら None。"""
+    raw_action = (form.get("action") or "").strip()
+    if raw_action.lower() in ("", "#") or raw_action.lower().startswith("javascript"):
+        if info: print("  [warn] Form action is JS-only.")
+        return None
+    submit_url = urljoin(IRI_BASE_URL, raw_action)
+    form_method = (form.get("method") or "post").lower()
+
+    # 隠しフィールドと out_vars を 1 回の走査で集める（option は直前の out_vars の select に属するもののみ）
+    hidden_inputs = {}
+    out_vars_values = []
+    out_select = None
+    for inp in form.iter("input", "select", "option"):
+        if inp.tag == "option":
+            parent = inp.getparent()
+            if parent is not None and parent.tag == "optgroup":
+                parent = parent.getparent()
+            if out_select is not None and parent is out_select and inp.get("value"):
+                out_vars_values.append(inp.get("value"))
+            continue
+        name = inp.get("name", "")
+        lname = name.lower()
+        is_out_var = "out" in lname and "var" in lname
+        if inp.tag == "select":
+            out_select = inp if is_out_var else None
+            continue
+        if name and inp.get("type", "").lower() in ("hidden", "submit", "button"):
+            hidden_inputs[name] = inp.get("value", "")
+        if is_out_var and inp.get("value"):
+            out_vars_values.append(inp.get("value"))
+    if not out_vars_values:
+        out_vars_values = list(_OUT_VARS_DEFAULT)
+
+    return {
+        "submit_url": submit_url,
+        "form_method": form_method,
+        "hidden_inputs": hidden_inputs,
+        "out_vars_values": out_vars_values,
+    }
+
+
+def _direct_post_meta(info=True):
+    """JS 専用フォームでも送信先 (_IRI_REAL_ENDPOINT) が分かっていれば、直接 POST 用のフォーム情報を返す。"""
+    if not _IRI_REAL_ENDPOINT:
+        return None
+    if info: print(f"  Posting directly to {_IRI_REAL_ENDPOINT}")
+    return {
+        "submit_url": _IRI_REAL_ENDPOINT,
+        "form_method": "post",
+        "hidden_inputs": {},
+        "out_vars_values": list(_OUT_VARS_DEFAULT),
+    }
+
+
+def _payload_values(date_time, longitude, latitude, min_alt, max_alt, step_alt):
+    """フォームに送る日時・座標・高度の文字列（範囲を補正して書式化したもの）の dict"""
+    latitude, longitude, min_alt, max_alt, step_alt = _clamp_coords(
+        latitude, longitude, min_alt, max_alt, step_alt
+    )
+    return {
+        'Year': str(date_time.year),
+        'Month': str(date_time.month),
+        'Day': str(date_time.day),
+        'Hour': str(date_time.hour),
+        'Minute': str(date_time.minute),
+        'Second': str(date_time.second),
+        'Longitude': f"{longitude:.3f}",
+        'Latitude': f"{latitude:.3f}",
+        'min_alt': f"{min_alt:.1f}",
+        'max_alt': f"{max_alt:.1f}",
+        'step_alt': f"{step_alt:.1f}",
+    }
+
+
+def _payload_values_many(date_times, longitudes, latitudes, min_alt=0, max_alt=2000.0, step_alt=50.0):
+    """
+    _payload_values の配列版。座標の補正と書式化は NumPy (np.char.mod) でまとめて行う。
+    戻り値の各 dict は run_iri_profile などの prebuilt_payload にそのまま渡せる。
+    """
+    lat, lon, min_alt, max_alt, step_alt = _clamp_coords(
+        np.asarray(latitudes, dtype=float), np.asarray(longitudes, dtype=float), min_alt, max_alt, step_alt
+    )
+    lon_str = np.char.mod('%.3f', lon).tolist()
+    lat_str = np.char.mod('%.3f', lat).tolist()
+    alts = {'min_alt': f"{min_alt:.1f}", 'max_alt': f"{max_alt:.1f}", 'step_alt': f"{step_alt:.1f}"}
+    date_strings = [
+        (str(dt.year), str(dt.month), str(dt.day), str(dt.hour), str(dt.minute), str(dt.second))
+        for dt in date_times
+    ]
+    return [
+        {
+            **dict(zip(('Year', 'Month', 'Day', 'Hour', 'Minute', 'Second'), ds)),
+            'Longitude': lon_s,
+            'Latitude': lat_s,
+            **alts,
+        }
+        for ds, lon_s, lat_s in zip(date_strings, lon_str, lat_str)
+    ]
+
+
+def _build_data_list(meta, values, model_version, time_type, coord_type):
+    """フォーム情報と入力値 (_payload_values) から送信する (name, value) のリストを作る。"""
+    payload = {
+        **values,
+        'ut_type': _translate_time_type(time_type),
+        'coord_type': _translate_coord_type(coord_type),
+        'alt_type': '0',   # 0: Altitude Profile
+        'grid_type': '0',  # 0: Standard Profile (Altitude)
+        'version': model_version,
+    }
+    # submit_button は送信ボタンの値。フォームに同名の hidden があればそちらを優先する
+    # （_direct_post_meta の hidden_inputs={} でも必ず送る）
+    fields = {'submit_button': 'Submit', **meta["hidden_inputs"], **payload}
+    data_list = [(k, str(v)) for k, v in fields.items()]
+    data_list += [("out_vars", str(v)) for v in meta["out_vars_values"]]
+    return data_list
+
+
+def _extract_result(content, url):
+    """
+    結果ページから (data_url, pre_text) を返す。
+    データ行を含む <pre>、ダウンロードリンク、<pre>、runID の順に探し、
+    <pre> で見つかった場合は data_url=None。どちらも見つからなければ (None, None)。
+    """
+    # 出力がページに埋め込まれていれば、リンク先を GET せずにそれを使う
+    pre_text = _parse.find_inline_output(content)
+    if pre_text is not None:
+        return None, pre_text
+    # リンクはまず bytes のまま探し、見つかれば文書全体の木は作らない
+    href = _parse.find_download_link(content)
+    if href:
+        return urljoin(url, href), None
+    html_doc = lxml.html.fromstring(content)
+    href = _find_download_link(html_doc)
+    if href:
+        return urljoin(url, href), None
+    pre = html_doc.find(".//pre")
+    pre_text = pre.text_content() if pre is not None else ""
+    if len(pre_text.strip()) > 100:
+        return None, pre_text
+    # リンクも <pre> も無ければ runID から出力ファイルの URL を推定する
+    return _runid_data_url(url, content), None
+
+
+def _run_iri_profile(
+    session: requests.Session,
+    date_time: datetime,
+    longitude: float,
+    latitude: float,
+    min_alt: float,
+    max_alt: float,
+    step_alt: float,
+    model_version: str,
+    timeout: float = 30.0,
+    time_type="UTC",
+    coord_type="Geographic",
+    info=True,
+    use_cache=True,
+    connect_timeout: float = _CONNECT_TIMEOUT,
+    values=None,
+    skip_warmup=True,
+):
+    """
+    IRIモデルを実行（requests, ブラウザなし）。
+    values は書式化済みの入力値 (_payload_values)。None ならここで作る。
+    skip_warmup=True なら、保存済みのフォーム情報があればフォームページを取得せずに送信する。
+    成功したら出力テキストの bytes, 失敗したら None を返す。
+    フォームが JS 専用の場合や結果が見つからない場合も None を返すので、
+    呼び出し側で Selenium にフォールバックする。
+    """
+    if info:
+        print("\n--- Downloading IRI model (requests) ---")
+
+    try:
+        if values is None:
+            values = _payload_values(date_time, longitude, latitude, min_alt, max_alt, step_alt)
+        refresh = {"force_refresh": True} if not use_cache and hasattr(session, "cache") else {}
+        timeouts = (connect_timeout, timeout)
+        # 403 で拒否された場合は隠しフィールドが古いとみなし、フォーム情報を取り直して1度だけ再送する
+        # （保存済みのフォーム情報で送った場合は、403 以外の 4xx でも取り直す）
+        for retry_form in (False, True):
+            # 1. フォームのアクション・隠しフィールドを取得（TTL 付きでキャッシュ）
+            meta = (
+                _get_form_meta(
+                    session, timeout=timeout, info=info, connect_timeout=connect_timeout,
+                    skip_warmup=skip_warmup, refresh=retry_form,
+                )
+                or _direct_post_meta(info=info)
+            )
+            if meta is None:
+                return None
+            submit_url = meta["submit_url"]
+            form_method = meta["form_method"]
+
+            # 2. ペイロードを準備
+            data_list = _build_data_list(meta, values, model_version, time_type, coord_type)
+
+            # 3. フォーム送信 (use_cache=False なら requests-cache のキャッシュを無視して再取得)
+            if form_method == "get":
+                r1 = session.get(submit_url, params=data_list, allow_redirects=True, timeout=timeouts, **refresh)
+            else:
+                r1 = session.post(submit_url, data=data_list, allow_redirects=True, timeout=timeouts, **refresh)
+            if retry_form or not _form_rejected(r1.status_code, meta):
+                break
+            if info: print(f"  [warn] Form submission rejected ({r1.status_code}). Refreshing form fields...")
+            _invalidate_form_meta(static=meta.get("static", False))
+        r1.raise_for_status()
+        if info: print("✔ Form submitted. Parsing results...")
+
+        # 4. ダウンロードリンク、<pre>、runID の順に結果を探す
+        data_url, pre_text = _extract_result(r1.content, r1.url)
+        if pre_text is not None:
+            if info: print("✔ Success (via pre tag)")
+            return pre_text.encode("utf-8")
+
+        if data_url:
+            if not use_cache and hasattr(session, "cache"):
+                session.cache.delete(urls=[data_url])
+            if info: print(f"Downloading data from: {data_url}")
+            content = _download(data_url, timeout=timeout, session=session, connect_timeout=connect_timeout)
+            if info: print("✔ Success")
+            return content
+
+        if info: print("✘ Error: Result content not found.")
+        return None
+
+    except Exception as e:
+        if info: print(f"✘ Exception in _run_iri_profile: {e}")
+        return None
+
+
+def _load_endpoint(model_version, time_type, coord_type):
+    """
+    記録済みのエンドポイントを返す。
+    記録時とモデル・時間/座標タイプが異なる場合（ボディに焼き込まれているため）は None。
+    """
+    global _ENDPOINT
+    if _ENDPOINT is None:
+        try:
+            with open(_ENDPOINT_FILE, encoding="utf-8") as f:
+                _ENDPOINT = json.load(f)
+        except (OSError, ValueError):
+            return None
+    if (
+        _ENDPOINT.get("model_version") != model_version
+        or _translate_time_type(_ENDPOINT.get("time_type")) != _translate_time_type(time_type)
+        or _translate_coord_type(_ENDPOINT.get("coord_type")) != _translate_coord_type(coord_type)
+    ):
+        return None
+    return _ENDPOINT
+
+
+def _invalidate_endpoint():
+    """記録済みのエンドポイントを破棄する（次の Selenium 実行で再学習される）。"""
+    global _ENDPOINT
+    _ENDPOINT = None
+    try:
+        os.remove(_ENDPOINT_FILE)
+    except OSError:
+        pass
+
+
+def _post_leaves(post_data):
+    """
+    記録した POST ボディ（JSON または form-urlencoded）を (body, leaves) に分解する。
+    leaves は (path, key, value) のリストで、path は JSON ならキー・添字のリスト、form-urlencoded なら [位置]。
+    """
+    try:
+        body = json.loads(post_data)
+    except ValueError:
+        body = None
+    if isinstance(body, (dict, list)):
+        leaves = []
+
+        def walk(obj, path, key):
+            items = obj.items() if isinstance(obj, dict) else enumerate(obj) if isinstance(obj, list) else None
+            if items is None:
+                leaves.append((path, key, obj))
+                return
+            for k, v in items:
+                walk(v, path + [k], k if isinstance(obj, dict) else key)
+
+        walk(body, [], None)
+        return body, leaves
+    pairs = parse_qsl(post_data, keep_blank_values=True)
+    return pairs, [([i], k, v) for i, (k, v) in enumerate(pairs)]
+
+
+def _same_value(leaf, value):
+    """POST ボディの値 leaf が入力値 value（文字列）と同じか（数値なら数値として比べる）。"""
+    if isinstance(leaf, bool) or leaf is None:
+        return False
+    if leaf == value:
+        return True
+    try:
+        return abs(float(leaf) - float(value)) < 1e-6
+    except (TypeError, ValueError):
+        return False
+
+
+def _map_post_fields(post_data, values):
+    """
+    values の各入力値が POST ボディのどこに入っているかを {name: path} で返す。
+    値が複数箇所にある場合はキー名が name（またはその別名）のものを選ぶ。
+    見つからない・1箇所に決まらない値があれば None（そのボディは差し替えて再送できない）。
+    """
+    _, leaves = _post_leaves(post_data)
+    fields = {}
+    for name, value in values.items():
+        paths = [(path, key) for path, key, leaf in leaves if _same_value(leaf, value)]
+        if len(paths) > 1:
+            names = {n.lower() for n in [name] + _FIELD_ALIASES.get(name, [])}
+            paths = [(path, key) for path, key in paths if isinstance(key, str) and key.lower() in names]
+        if len(paths) != 1 or paths[0][0] in fields.values():
+            return None
+        fields[name] = paths[0][0]
+    return fields
+
+
+def _fill_post_data(post_data, values, fields):
+    """
+    記録した POST ボディの入力値を、学習時に対応づけた位置 (fields) で差し替える。
+    差し替えられない値が1つでもあれば None（学習した地点の結果を返してしまわないように）。
+    """
+    if not fields or set(fields) != set(values):
+        return None
+    body, _ = _post_leaves(post_data)
+    for name, path in fields.items():
+        if isinstance(body, list) and body and isinstance(body[0], tuple):
+            i = path[0]
+            if not isinstance(i, int) or not 0 <= i < len(body):
+                return None
+            body[i] = (body[i][0], values[name])
+            continue
+        obj = body
+        try:
+            for k in path[:-1]:
+                obj = obj[k]
+            old = obj[path[-1]]
+        except (KeyError, IndexError, TypeError):
+            return None
+        is_number = isinstance(old, (int, float)) and not isinstance(old, bool)
+        obj[path[-1]] = float(values[name]) if is_number else values[name]
+    if isinstance(body, list) and body and isinstance(body[0], tuple):
+        return urlencode(body)
+    return json.dumps(body)
+
+
+def _run_iri_profile_endpoint(
+    session: requests.Session,
+    endpoint: dict,
+    date_time: datetime,
+    longitude: float,
+    latitude: float,
+    min_alt: float,
+    max_alt: float,
+    step_alt: float,
+    model_version: str,
+    timeout: float = 30.0,
+    time_type="UTC",
+    coord_type="Geographic",
+    info=True,
+    connect_timeout: float = _CONNECT_TIMEOUT,
+):
+    """
+    記録済みの XHR エンドポイントに直接 POST して IRI モデルを実行する（ブラウザなし）。
+    成功したら出力テキストの bytes, 失敗したら None を返す。
+    """
+    if info:
+        print("\n--- Downloading IRI model (learned endpoint) ---")
+    try:
+        values = _form_values(date_time, longitude, latitude, min_alt, max_alt, step_alt)
+        data = _fill_post_data(endpoint["post_data"], values, endpoint.get("fields"))
+        if data is None:
+            if info: print("✘ Error: Recorded endpoint body does not carry all input values.")
+            return None
+        r = session.post(
+            endpoint["url"], data=data.encode("utf-8"), headers=endpoint["headers"],
+            timeout=(connect_timeout, timeout),
+        )
+        r.raise_for_status()
+        data_url = _runid_data_url(r.url, r.content)
+        if data_url is None:
+            if info: print("✘ Error: runID not found in endpoint response.")
+            return None
+        if info: print(f"Downloading data from: {data_url}")
+        content = _download(data_url, timeout=timeout, session=session, connect_timeout=connect_timeout)
+        if info: print("✔ Success")
+        return content
+    except Exception as e:
+        if info: print(f"✘ Exception in _run_iri_profile_endpoint: {e}")
+        return None
+
+
+def _fetch_iri_profile(
+        date_time: datetime,
+        longitude: float,
+        latitude: float,
+        min_alt: float = 0,
+        max_alt: float = 2000.0,
+        step_alt: float = 50.0,
+        model_version: str = "IRI 2020",
+        timeout: float = 30.0,
+        time_type="UTC",
+        coord_type="Geographic",
+        info=True,
+        max_retries: int = 3,
+        use_cache: bool = True,
+        keep_driver: bool = True,
+        session: requests.Session = None,
+        use_endpoint: bool = True,
+        connect_timeout: float = _CONNECT_TIMEOUT,
+        prebuilt_payload=None,
+        skip_warmup: bool = True,
+        selenium_lock=None,
+):
+    """
+    run_iri_profile の本体。出力テキストを bytes で返す（最大リトライ後も失敗なら None）。
+    selenium_lock を渡すと、Selenium へのフォールバック（Chrome の起動を含む）はそれを取ってから行う
+    （複数スレッドから呼ぶ場合に Chrome を同時に1つまでにする）。
+    """
+    values = prebuilt_payload or _payload_values(date_time, longitude, latitude, min_alt, max_alt, step_alt)
+    cache_key = _result_cache_key(values, model_version, time_type, coord_type)
+    if use_cache:
+        try:
+            content = _cached_result(cache_key)
+            if info: print("✔ Success (from result cache)")
+            return content
+        except KeyError:
+            pass
+
+    # TCP/TLS 接続を使い回すため、セッションはリトライ間・呼び出し間で共有する
+    # use_cache=False でもキャッシュ付きセッションを使い、取得結果でキャッシュを更新する
+    if session is None:
+        session = _get_session()
+    driver = None
+    try:
+        for attempt in range(max_retries):
+            if info and attempt > 0:
+                print(f"\n{'='*20}")
+                print(f"RETRY ATTEMPT: {attempt + 1} / {max_retries}")
+                print(f"{'='*20}")
+
+            kwargs = dict(
+                date_time=date_time,
+                longitude=longitude,
+                latitude=latitude,
+                min_alt=min_alt,
+                max_alt=max_alt,
+                step_alt=step_alt,
+                model_version=model_version,
+                time_type=time_type,
+                coord_type=coord_type,
+                info=info
+            )
+            content = _run_iri_profile(
+                session, timeout=timeout, use_cache=use_cache, connect_timeout=connect_timeout,
+                values=values, skip_warmup=skip_warmup, **kwargs
+            )
+            if content is None and use_endpoint:
+                endpoint = _load_endpoint(model_version, time_type, coord_type)
+                if endpoint is not None:
+                    content = _run_iri_profile_endpoint(
+                        session, endpoint, timeout=timeout, connect_timeout=connect_timeout, **kwargs
+                    )
+                    if content is None:
+                        _invalidate_endpoint()
+            if content is None:
+                if info: print("  [warn] Falling back to Selenium.")
+                with selenium_lock or contextlib.nullcontext():
+                    if driver is None:
+                        try:
+                            driver = _get_driver()
+                        except Exception as e:
+                            # Chrome / chromedriver が起動できない場合も、この試行の失敗として扱う
+                            if info: print(f"✘ Exception in starting Chrome: {e}")
+                    if driver is not None:
+                        content = _run_iri_profile_selenium(
+                            timeout=timeout*2, driver=driver, learn_endpoint=use_endpoint, **kwargs
+                        )
+                    if driver is not None and selenium_lock is not None and not keep_driver:
+                        # ロックを離す前に終了し、他のスレッドの Chrome と同時に残らないようにする
+                        _quit_driver()
+                        driver = None
+
+            if content is not None:
+                _store_cached_bytes(cache_key, content)
+                return content
+
+            if attempt < max_retries - 1:
+                wait_time = 5 * (attempt + 1)
+                if info: print(f"Waiting {wait_time}s before next attempt...")
+                time.sleep(wait_time)
+    finally:
+        if driver is not None:
+            if keep_driver:
+                _reset_driver(driver)
+            else:
+                _quit_driver()
+
+    if info:
+        print(f"\n[FATAL] Failed to retrieve IRI profile after {max_retries} attempts.")
+    return None
+
+
 def run_iri_profile(
         date_time: datetime,
         longitude: float,
@@ -196,49 +1460,439 @@ def run_iri_profile(
         max_alt: float = 2000.0,
         step_alt: float = 50.0,
         model_version: str = "IRI 2020",
-        output_filename: str = "iri_profile_output.txt",
+        write_to: str = None,
         timeout: float = 30.0,
         time_type="UTC",
         coord_type="Geographic", 
         info=True,
-        max_retries: int = 3
-) -> int:
+        max_retries: int = 3,
+        use_cache: bool = True,
+        keep_driver: bool = True,
+        session: requests.Session = None,
+        use_endpoint: bool = True,
+        connect_timeout: float = _CONNECT_TIMEOUT,
+        prebuilt_payload: dict = None,
+        skip_warmup: bool = True,
+        transport: str = "requests",
+):
     """
     IRIモデルを実行し、失敗した場合は指定回数リトライする。
-    成功なら0、最大リトライ後も失敗なら1を返す。
+    まず requests で直接フォームを送信し、失敗した場合のみ Selenium にフォールバックする。
+    use_cache=True なら、同一パラメータの出力を ~/.cache/iri_model から（通信せずに）返し、
+    無ければ requests-cache (インストール済みの場合) の結果を再利用する。
+    取得した出力は use_cache に関わらず結果キャッシュに保存する。
+    Selenium の Chrome はリトライ間・呼び出し間で使い回し、インタプリタ終了時に閉じる
+    （keep_driver=False なら呼び出しの最後に終了する）。
+    session を渡した場合はそれを使い（閉じない）、None ならモジュール共通のものを使う。
+    use_endpoint=True なら、Selenium 実行時に記録した XHR エンドポイントを
+    ブラウザなしで直接叩き、使えなければ記録を破棄して Selenium で再学習する。
+    HTTP の接続タイムアウトは connect_timeout、読み込みタイムアウトは timeout。
+    出力テキスト (str) を返し、最大リトライ後も失敗なら None を返す。
+    write_to を指定した場合は、出力をそのファイルにも保存する。
+    prebuilt_payload に _payload_values_many() の要素を渡すと、日時・座標の書式化を省略する
+    （date_time などの値と一致している必要がある）。
+    skip_warmup=True なら、以前に保存したフォーム情報 (~/.cache/iri_model/form.json) を使ってフォームページの GET を省く
+    （送信が 4xx で拒否されたら取り直して再送する）。
+    transport="httpx" なら最初の送信を httpx（h2 があれば HTTP/2）で行い、失敗したら上記の requests 以降の
+    経路にフォールバックする（fetch_iri_profile_async を新しいイベントループで実行する）。
     """
-    for attempt in range(max_retries):
-        if info and attempt > 0:
-            print(f"\n{'='*20}")
-            print(f"RETRY ATTEMPT: {attempt + 1} / {max_retries}")
-            print(f"{'='*20}")
-        
-        status = _run_iri_profile_selenium(
-            date_time=date_time,
-            longitude=longitude,
-            latitude=latitude,
-            min_alt=min_alt,
-            max_alt=max_alt,
-            step_alt=step_alt,
-            model_version=model_version,
-            output_filename=output_filename,
-            timeout=timeout*2,
+    if transport not in _TRANSPORTS:
+        raise ValueError(f"transport must be one of {_TRANSPORTS}: {transport!r}")
+    if transport == "httpx" and httpx is not None and not _in_event_loop():
+        content = asyncio.run(_fetch_with_new_client(
+            date_time, longitude, latitude, min_alt, max_alt, step_alt, model_version,
+            timeout=timeout,
             time_type=time_type,
             coord_type=coord_type,
-            info=info
+            info=info,
+            use_cache=use_cache,
+            connect_timeout=connect_timeout,
+            prebuilt_payload=prebuilt_payload,
+            skip_warmup=skip_warmup,
+            max_retries=max_retries,
+            keep_driver=keep_driver,
+            session=session,
+            use_endpoint=use_endpoint,
+        ))
+        return _finish_result(content, write_to, info)
+    if transport == "httpx" and info:
+        print("  [warn] httpx transport is unavailable here. Using requests.")
+    content = _fetch_iri_profile(
+        date_time, longitude, latitude, min_alt, max_alt, step_alt, model_version,
+        timeout=timeout,
+        time_type=time_type,
+        coord_type=coord_type,
+        info=info,
+        max_retries=max_retries,
+        use_cache=use_cache,
+        keep_driver=keep_driver,
+        session=session,
+        use_endpoint=use_endpoint,
+        connect_timeout=connect_timeout,
+        prebuilt_payload=prebuilt_payload,
+        skip_warmup=skip_warmup,
+    )
+    return _finish_result(content, write_to, info)
+
+
+def _finish_result(content, write_to, info=True):
+    """取得した出力 (bytes) を write_to に保存し、str で返す（content が None なら None）。"""
+    if content is None:
+        return None
+    if write_to is not None:
+        _write_bytes(write_to, content)
+        if info: print(f"✔ Success: Saved to '{write_to}'")
+    return content.decode("utf-8", "replace")
+
+
+def _in_event_loop():
+    """このスレッドでイベントループが動いているか"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def run_iri_profile_batch(
+        params_list,
+        max_workers: int = 16,
+        use_cache: bool = True,
+        info=False,
+):
+    """
+    複数の run_iri_profile を並列に実行する。
+
+    Parameters
+    ----------
+    params_list : list of dict
+        各要素は run_iri_profile のキーワード引数。
+        write_to が無い場合は 'iri_profile_output_{i}.txt' に保存する。
+    max_workers : int
+        並列数。各ワーカーは自分専用の requests.Session と Chrome ドライバを持ち、
+        担当するパラメータ間で使い回す（Cookie はスレッドセーフでないので共有しない）。
+        CCMC への同時接続数は、プロセス全体で _HOST_SEMAPHORE により制限する。
+
+    Returns
+    -------
+    list
+        params_list と同じ順の出力ファイル名。失敗した要素は None、
+        例外が発生した要素はその例外オブジェクト。
+    """
+    # 座標の補正は全パラメータ分をまとめて NumPy で行う
+    params_list = [dict(params) for params in params_list]
+    if params_list:
+        lat, lon, *_ = _clamp_coords(
+            np.array([params["latitude"] for params in params_list], dtype=float),
+            np.array([params["longitude"] for params in params_list], dtype=float),
         )
-        
-        if status == 0:
-            return 0
-        
-        if attempt < max_retries - 1:
-            wait_time = 5 * (attempt + 1)
-            if info: print(f"Waiting {wait_time}s before next attempt...")
-            time.sleep(wait_time)
-            
+        for params, lat_i, lon_i in zip(params_list, lat, lon):
+            params["latitude"] = float(lat_i)
+            params["longitude"] = float(lon_i)
+
+    local = threading.local()
+    sessions = []
+    idents = set()
+    lock = threading.Lock()
+
+    def _worker(args):
+        i, params = args
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = _new_session(use_cache=use_cache)
+            with lock:
+                sessions.append(session)
+                idents.add(threading.get_ident())
+        params.setdefault("write_to", f"iri_profile_output_{i}.txt")
+        params.setdefault("use_cache", use_cache)
+        params.setdefault("info", info)
+        with _HOST_SEMAPHORE:
+            text = run_iri_profile(session=session, keep_driver=True, **params)
+        return params["write_to"] if text is not None else None
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_worker, args) for args in enumerate(params_list)]
+            wait_futures(futures)
+        results = []
+        for i, future in enumerate(futures):
+            e = future.exception()
+            if e is not None:
+                if info: print(f"✘ Exception in run_iri_profile_batch[{i}]: {e}")
+                results.append(e)
+            else:
+                results.append(future.result())
+        return results
+    finally:
+        for session in sessions:
+            session.close()
+        for ident in idents:
+            _quit_driver(ident)
+
+
+def _new_async_client(use_http2=None):
+    """
+    IRI 用の httpx.AsyncClient を作成する（接続は最大 _ASYNC_MAX_CONNECTIONS 本まで使い回す）。
+    use_http2=None なら h2 がインストールされている場合のみ HTTP/2 を使う。
+    """
+    if httpx is None:
+        raise ImportError("httpx is required for the async IRI API (pip install httpx[http2])")
+    return httpx.AsyncClient(
+        http2=_ASYNC_HTTP2 if use_http2 is None else use_http2,
+        limits=httpx.Limits(max_connections=_ASYNC_MAX_CONNECTIONS),
+        headers=_HEADERS,
+        follow_redirects=True,
+    )
+
+
+# イベントループごとの共通 AsyncClient（クライアントは生成したループに束縛されるため）
+_ASYNC_CLIENTS = weakref.WeakKeyDictionary()
+
+
+def _get_async_client():
+    """実行中のイベントループに対応する共通 AsyncClient を返す（無ければ作る）。"""
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_CLIENTS.get(loop)
+    if client is None or client.is_closed:
+        client = _ASYNC_CLIENTS[loop] = _new_async_client()
+    return client
+
+
+async def _fetch_iri_profile_httpx(
+    client,
+    date_time: datetime,
+    longitude: float,
+    latitude: float,
+    min_alt: float,
+    max_alt: float,
+    step_alt: float,
+    model_version: str,
+    timeout: float = 30.0,
+    time_type="UTC",
+    coord_type="Geographic",
+    info=True,
+    connect_timeout: float = _CONNECT_TIMEOUT,
+    values=None,
+    skip_warmup=True,
+):
+    """
+    IRIモデルを実行（httpx.AsyncClient, ブラウザなし）。_run_iri_profile の非同期版。
+    HTML のパースはスレッドに逃がし、イベントループを止めない。
+    ファイルには書かず、出力テキストを bytes で返す。失敗したら None。
+    """
     if info:
-        print(f"\n[FATAL] Failed to retrieve IRI profile after {max_retries} attempts.")
-    return 1
+        print("\n--- Downloading IRI model (httpx) ---")
+
+    if values is None:
+        values = _payload_values(date_time, longitude, latitude, min_alt, max_alt, step_alt)
+    timeouts = httpx.Timeout(timeout, connect=connect_timeout)
+    try:
+        # 拒否された場合はフォーム情報を取り直して1度だけ再送する（同期版と同じ）
+        for retry_form in (False, True):
+            # 1. フォーム情報（キャッシュは同期版と共有）
+            hit, meta = _cached_form_meta()
+            if not hit and skip_warmup and not retry_form:
+                meta = _static_form_meta()
+                hit = meta is not None
+            if hit:
+                if meta is not None:
+                    client.cookies.update(meta["cookies"])
+            else:
+                r0 = await client.get(IRI_BASE_URL, timeout=timeouts)
+                r0.raise_for_status()
+                meta = await asyncio.to_thread(_store_form_meta, r0.content, dict(r0.cookies), info)
+            meta = meta or _direct_post_meta(info=info)
+            if meta is None:
+                return None
+
+            # 2. フォーム送信
+            data_list = _build_data_list(meta, values, model_version, time_type, coord_type)
+            if meta["form_method"] == "get":
+                r1 = await client.get(meta["submit_url"], params=data_list, timeout=timeouts)
+            else:
+                r1 = await client.post(
+                    meta["submit_url"],
+                    content=urlencode(data_list),
+                    headers={"Content-Type": "application/x-www-form-urlencoded"},
+                    timeout=timeouts,
+                )
+            if retry_form or not _form_rejected(r1.status_code, meta):
+                break
+            if info: print(f"  [warn] Form submission rejected ({r1.status_code}). Refreshing form fields...")
+            _invalidate_form_meta(static=meta.get("static", False))
+        r1.raise_for_status()
+        if info: print("✔ Form submitted. Parsing results...")
+
+        # 3. ダウンロードリンク、<pre>、runID の順に結果を探す
+        data_url, pre_text = await asyncio.to_thread(_extract_result, r1.content, str(r1.url))
+        if pre_text is not None:
+            if info: print("✔ Success (via pre tag)")
+            return pre_text.encode("utf-8")
+
+        if data_url:
+            if info: print(f"Downloading data from: {data_url}")
+            r2 = await client.get(data_url, timeout=timeouts)
+            r2.raise_for_status()
+            if info: print("✔ Success")
+            return r2.content
+
+        if info: print("✘ Error: Result content not found.")
+        return None
+
+    except Exception as e:
+        if info: print(f"✘ Exception in _fetch_iri_profile_httpx: {e}")
+        return None
+
+
+async def fetch_iri_profile_async(
+        date_time: datetime,
+        longitude: float,
+        latitude: float,
+        min_alt: float = 0,
+        max_alt: float = 2000.0,
+        step_alt: float = 50.0,
+        model_version: str = "IRI 2020",
+        timeout: float = 30.0,
+        time_type="UTC",
+        coord_type="Geographic",
+        info=True,
+        use_cache: bool = True,
+        connect_timeout: float = _CONNECT_TIMEOUT,
+        client=None,
+        fallback: bool = True,
+        prebuilt_payload: dict = None,
+        skip_warmup: bool = True,
+        fallback_executor=None,
+        **kwargs,
+):
+    """
+    IRIモデルを非同期に実行し、出力テキストを bytes で返す（ファイルには書かない）。失敗したら None。
+    client を渡した場合はそれを使い（閉じない）、None ならイベントループ共通のものを使う
+    （httpx が無ければ最初から同期版を使う）。
+    失敗した場合、fallback=True なら同期版 run_iri_profile（エンドポイント・Selenium・リトライ）を
+    スレッドで実行する。kwargs はそのまま run_iri_profile に渡す。
+    結果キャッシュ（use_cache）は同期版と共有する。
+    prebuilt_payload, skip_warmup は run_iri_profile と同じ。
+    fallback_executor を渡すと、同期版はそのスレッドプールで実行する（None なら asyncio.to_thread）。
+    多数を並行に実行する場合は1スレッドのものを渡すと、Chrome とセッションを1つのスレッドだけが使う。
+    """
+    values = prebuilt_payload or _payload_values(date_time, longitude, latitude, min_alt, max_alt, step_alt)
+    cache_key = _result_cache_key(values, model_version, time_type, coord_type)
+    if use_cache:
+        try:
+            return _cached_result(cache_key)
+        except KeyError:
+            pass
+
+    params = dict(
+        date_time=date_time,
+        longitude=longitude,
+        latitude=latitude,
+        min_alt=min_alt,
+        max_alt=max_alt,
+        step_alt=step_alt,
+        model_version=model_version,
+        timeout=timeout,
+        time_type=time_type,
+        coord_type=coord_type,
+        info=info,
+        connect_timeout=connect_timeout,
+    )
+    if client is None and httpx is not None:
+        client = _get_async_client()
+    data = None
+    if client is not None:
+        data = await _fetch_iri_profile_httpx(client, values=values, skip_warmup=skip_warmup, **params)
+    if data is not None:
+        _store_cached_bytes(cache_key, data)
+    elif fallback:
+        if info: print("  [warn] Falling back to run_iri_profile.")
+        fallback_call = functools.partial(
+            _fetch_iri_profile, use_cache=use_cache, prebuilt_payload=values, skip_warmup=skip_warmup,
+            **params, **kwargs
+        )
+        if fallback_executor is None:
+            data = await asyncio.to_thread(fallback_call)
+        else:
+            data = await asyncio.get_running_loop().run_in_executor(fallback_executor, fallback_call)
+    return data
+
+
+async def _fetch_with_new_client(*args, **kwargs):
+    """専用の AsyncClient で fetch_iri_profile_async を実行し、終わったら閉じる（asyncio.run 用）。"""
+    async with _new_async_client() as client:
+        return await fetch_iri_profile_async(*args, client=client, **kwargs)
+
+
+async def run_iri_profile_async(
+        date_time: datetime,
+        longitude: float,
+        latitude: float,
+        min_alt: float = 0,
+        max_alt: float = 2000.0,
+        step_alt: float = 50.0,
+        model_version: str = "IRI 2020",
+        write_to: str = None,
+        timeout: float = 30.0,
+        time_type="UTC",
+        coord_type="Geographic",
+        info=True,
+        **kwargs,
+):
+    """
+    run_iri_profile の非同期版。kwargs はそのまま fetch_iri_profile_async に渡す。
+    出力テキスト (str) を返し、失敗なら None を返す。
+    write_to を指定した場合は、出力をそのファイルにも保存する。
+    """
+    data = await fetch_iri_profile_async(
+        date_time, longitude, latitude, min_alt, max_alt, step_alt, model_version,
+        timeout=timeout, time_type=time_type, coord_type=coord_type, info=info, **kwargs,
+    )
+    return _finish_result(data, write_to, info)
+
+
+async def run_iri_profile_many(
+        params_list,
+        concurrency: int = 8,
+        info=False,
+):
+    """
+    複数の run_iri_profile_async を 1 つのイベントループ上で並行に実行する。
+
+    Parameters
+    ----------
+    params_list : list of dict
+        各要素は run_iri_profile_async のキーワード引数。
+        write_to が無い場合は 'iri_profile_output_{i}.txt' に保存する。
+    concurrency : int
+        CCMC へ同時に投げるリクエスト数の上限。接続は 1 つの AsyncClient で共有する。
+
+    Returns
+    -------
+    list
+        params_list と同じ順の出力ファイル名。失敗した要素は None、
+        例外が発生した要素はその例外オブジェクト。
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _worker(i, params, client):
+        params = dict(params)
+        params.setdefault("write_to", f"iri_profile_output_{i}.txt")
+        params.setdefault("info", info)
+        async with semaphore:
+            text = await run_iri_profile_async(client=client, **params)
+        return params["write_to"] if text is not None else None
+
+    async with _new_async_client() as client:
+        results = await asyncio.gather(
+            *[_worker(i, params, client) for i, params in enumerate(params_list)],
+            return_exceptions=True,
+        )
+    for i, r in enumerate(results):
+        if isinstance(r, Exception) and info:
+            print(f"✘ Exception in run_iri_profile_many[{i}]: {r}")
+    return list(results)
+
 
 
 # ------ 2026.01.15 --------------
@@ -3,10 +3,41 @@ import os
 import numpy as np
 from datetime import datetime, timedelta, UTC
 import glob
-from common import display, time
-
-
-def extract_iri_profile_data(filepath):
+from common import display
+from ._parse import is_data_row as _is_data_row
+
+
+# ヘッダー4行目の日時 (例: "2024/ 42/ 12.5UT")
+_HDR_RE = re.compile(r'(\d{4})/\s*(-?\d+)/\s*([\d.]+)UT')
+# データ行の先頭になりうる文字
+_NUMERIC_START = frozenset('0123456789+-.')
+
+# 出力の列名と、MKSA 単位への換算係数
+# （換算係数は float64 のまま持ち、float32 で読んだ場合も積は float64 で計算してから丸める）
+_KEYS = (
+    'altitude', # [km] -> [m]
+    'Ne', # [/cm^3] -> [/m^3]
+    'Ne/NmF2', # ratio
+    'Tn', # [K]
+    'Ti', # [K]
+    'Te', # [K]
+    'O+', # [%]*10 -> [%]
+    'N+', # [%]*10 -> [%]
+    'H+', # [%]*10 -> [%]
+    'He+', # [%]*10 -> [%]
+    'O2+', # [%]*10 -> [%]
+    'NO+', # [%]*10 -> [%]
+    'Clust', # 1e16 [m^2]
+    'TEC', # 1e16 [m^2]
+    't/%', # 1e16 [m^2]
+)
+_SCALE = np.array(
+    [1e3, 1e6, 1.0, 1.0, 1.0, 1.0, 0.1, 0.1, 0.1, 0.1, 0.1, 0.1, 1e16, 1e16, 1e16],
+    dtype=np.float64,
+)
+
+
+def extract_iri_profile_data(filepath, dtype=np.float32):
     """
     IRIプロファイル出力テキストから高度(H)とイオン組成比を抽出します。
     
@@ -20,6 +51,8 @@ def extract_iri_profile_data(filepath):
     ----------
     file_content : str
         iri_profile_output.txt のファイル内容全体を読み込んだ文字列。
+    dtype : numpy dtype
+        返す配列の型。IRI の出力は有効数字4桁程度なので既定は float32。
 
     Returns
     -------
@@ -34,9 +67,34 @@ def extract_iri_profile_data(filepath):
         raise ValueError(f'Input file must be txt: {filepath}')
     
     file_content = open(filepath, "r").read()
-    
-    extracted_data = []
-    
+    return _parse_iri_text(file_content, dtype=dtype)
+
+
+def _find_data_start(lines):
+    """最初のデータ行の番号を返す。無ければ None。"""
+    for i, line in enumerate(lines):
+        if _is_data_row(line):
+            return i
+    return None
+
+
+def _find_data_end(lines, start):
+    """
+    start 行から続くデータ行の塊の終わり（最初の数値で始まらない行の番号）を返す。
+    IRI のデータ行は連続しているので、その後ろの説明行などは読まない（空行は塊の中に含める）。
+    """
+    for i in range(start, len(lines)):
+        stripped = lines[i].lstrip()
+        if stripped and stripped[0] not in _NUMERIC_START:
+            return i
+    return len(lines)
+
+
+def _parse_iri_text(file_content, dtype=np.float32):
+    """
+    IRIプロファイル出力テキスト (str) をパースする。extract_iri_profile_data の本体。
+    ファイルを介さずにダウンロード結果を直接渡せる。
+    """
     # ファイル内容を行ごとに分割
     lines = file_content.split('\n')
 
@@ -46,7 +104,7 @@ def extract_iri_profile_data(filepath):
     if len(lines) >= 4:
         header_line = lines[3]
 
-        match = re.search(r'(\d{4})/\s*(-?\d+)/\s*([\d\.]+)UT', header_line)
+        match = _HDR_RE.search(header_line)
         
         if match:
             year_str = match.group(1) 
@@ -55,27 +113,15 @@ def extract_iri_profile_data(filepath):
 
             year = int(year_str)
             # DOYは符号を無視して整数化 (例: '-42' -> 42)。IRIのDOYは1から始まる。
-            doy = int(doy_str.lstrip('-').strip())
+            doy = int(doy_str.lstrip('-'))
             ut_hour = float(ut_hour_str)
-            
-            # 1. 日付の計算 (YYYY-mm-dd)
-            # 1月1日からDOY-1日後の日付を計算 (うるう年にも対応)
-            date_obj = datetime(year, 1, 1) + timedelta(days=doy - 1)
-
-            # 2. 時刻の計算 (HH:MM:SS)
-            hours = int(ut_hour)
-            minutes_float = (ut_hour - hours) * 60.0
-            minutes = int(minutes_float)
-            
-            seconds_float = (minutes_float - minutes) * 60.0
-            seconds = int(round(seconds_float))
-            
-            # 3. timedelta を使って日時を結合し、繰り上げを自動処理
-            time_delta = timedelta(hours=hours, minutes=minutes, seconds=seconds)
-            # date_objに時間情報を加算（時間繰り上げも自動処理）
-            final_datetime = date_obj.replace(hour=0, minute=0, second=0, microsecond=0) + time_delta
-
-            # 4. 指定フォーマット (YYYY-mm-dd HH:MM:SS) での出力
+
+            # 1月1日から DOY-1 日と UT 秒を足す（うるう年・時刻の繰り上げも timedelta が処理する）
+            final_datetime = datetime(year, 1, 1, tzinfo=UTC) + timedelta(
+                days=doy - 1, seconds=int(round(ut_hour * 3600))
+            )
+
+            # 指定フォーマット (YYYY-mm-dd HH:MM:SS) での出力
             time_str = final_datetime.strftime('%Y-%m-%d %H:%M:%S')
 
     if time_str is None:
@@ -84,91 +130,34 @@ def extract_iri_profile_data(filepath):
     # プロファイルデータが始まる行を見つける
     # IRI出力では、プロファイルデータは通常、最初の数行のヘッダー情報（空行も含む）
     # の後に始まります。最初の数値データ行を探します。
-    data_start_found = False
-    
-    for line in lines:
-        # 空白を複数のスペースとみなし、連続する空白を1つのスペースに置換
-        cleaned_line = re.sub(r'\s+', ' ', line.strip())
-        
-        # 行が空でないことを確認
-        if not cleaned_line:
-            continue
-            
-        # 最初の要素が数値（高度）で始まっているかチェックし、
-        # データ行かどうかを判断します。
-        # IRIのデータ行は、例えば " 1800.0 15105 0.012 1030 3869 3869 23 8 900 68 0 0 -1 39.7 63" のように、
-        # 最初の数値の後に続くデータが豊富です。
-        
-        try:
-            # 高度 (H) は常に浮動小数点数です
-            parts = cleaned_line.split()
-            if len(parts) < 10: # 必要な列（HからO2+まで）が揃っているか確認
-                continue
-                
-            # 最初の要素が数値に変換可能か確認
-            H = float(parts[0])
-            
-            # 抽出した文字列を浮動小数点数に変換
-            data_row = []
-            for i in range(len(parts)):
-                data_row.append(parts[i])
-            
-            extracted_data.append(data_row)
-            data_start_found = True
-            
-        except ValueError:
-            # 最初の要素が数値でなかった場合（ヘッダー行、説明行、空行など）
-            # データ行が既に始まっていれば、抽出を続行する（今回は不要だが、一般的なパース処理として）
-            # データ行開始前であればスキップ
-            if data_start_found:
-                # データ行が終わったと判断し、処理を終了しても良いが、
-                # IRI出力は通常、データブロックが連続するため、単にスキップ
-                pass 
+    data_start = _find_data_start(lines)
+    if data_start is None:
+        return
 
-    
-    dict_return = {}
+    data_end = _find_data_end(lines, data_start)
+    data_lines = lines[data_start:data_end]
 
-    if not extracted_data:
-        return
+    # 数値への変換は np.loadtxt (C 実装) に1度で任せる（空行は読み飛ばされる）
+    try:
+        extracted_data = np.loadtxt(data_lines, dtype=dtype, ndmin=2)
+    except ValueError:
+        # 塊の中に列の足りない行などがある場合は、データ行だけを選んで変換する
+        extracted_data = np.loadtxt(
+            [line for line in data_lines if _is_data_row(line)], dtype=dtype, ndmin=2
+        )
+
+    dict_return = {}
 
     # list -> ndarray
     dict_return['time_str'] = time_str
-    dict_return['time_unix'] = time.convert(time_str, frm='str', into='unix')
-    extracted_data = np.array(extracted_data, dtype=float)
-
-    keys = [
-        'altitude', # [km]
-        'Ne', # [/cm^3]
-        'Ne/NmF2', # ratio
-        'Tn', # [K]
-        'Ti', # [K]
-        'Te', # [K]
-        'O+', # [%]*10
-        'N+', # [%]*10
-        'H+', # [%]*10
-        'He+', # [%]*10
-        'O2+', # [%]*10
-        'NO+', # [%]*10
-        'Clust', # 1e16 [m^2]
-        'TEC', # 1e16 [m^2]
-        't/%', # 1e16 [m^2]
-    ]
-
-    for i, key in enumerate(keys):
+    # UT の日時から直接 unix 時刻にする（time_str を再パースしない）
+    dict_return['time_unix'] = final_datetime.timestamp()
+
+    # -> MKSA unit（全列を1回のブロードキャストで換算する）
+    extracted_data = extracted_data[:, :len(_KEYS)]
+    extracted_data *= _SCALE
+    for i, key in enumerate(_KEYS):
         dict_return[key] = extracted_data[:, i]
-    
-    # -> MKSA unit
-    dict_return['altitude'] *= 1e3 # [m]
-    dict_return['Ne'] *= 1e6 # [/m^3]
-    dict_return['O+'] /= 10 # [%]
-    dict_return['N+'] /= 10 # [%]
-    dict_return['H+'] /= 10 # [%]
-    dict_return['He+'] /= 10 # [%]
-    dict_return['O2+'] /= 10 # [%]
-    dict_return['NO+'] /= 10 # [%]
-    dict_return['Clust'] *= 1e16 # [m^2]
-    dict_return['TEC'] *= 1e16 # [m^2]
-    dict_return['t/%'] *= 1e16 # [m^2]
 
     return dict_return
 
@@ -0,0 +1,77 @@
+import html
+import re
+
+
+# 結果ページの <a ...>...</a> を木を作らずに bytes のまま走査する
+# (re は C 実装なので、タグ探索は libxml2 で文書全体をパースするより軽い)
+_ANCHOR_RE = re.compile(rb"<a\b([^>]*)>(.*?)</a\s*>", re.IGNORECASE | re.DOTALL)
+_HREF_RE = re.compile(
+    rb"""\bhref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""", re.IGNORECASE
+)
+_TAG_RE = re.compile(rb"<[^>]*>")
+_LINK_TEXT_WORDS = (b"download", b"raw output", b"view raw")
+# 結果ページに直接埋め込まれた出力 (<pre>)
+_PRE_RE = re.compile(rb"<pre\b[^>]*>(.*?)</pre\s*>", re.IGNORECASE | re.DOTALL)
+# データ行とみなす最小の列数（HからO2+まで）
+MIN_DATA_COLS = 10
+
+
+def find_download_link(content: bytes):
+    """
+    結果ページ (bytes) からダウンロードリンクの href を返す。無ければ None。
+    判定は _downloader._DL_XPATH と同じ（文字列に download / raw output / view raw を含むか、
+    href が .txt / .out で終わる・/data/ や output を含む <a>）。
+    """
+    # <a が無ければ正規表現も回さない
+    if content.find(b"<a") < 0 and content.find(b"<A") < 0:
+        return None
+    for m in _ANCHOR_RE.finditer(content):
+        h = _HREF_RE.search(m.group(1))
+        if h is None:
+            continue
+        href = h.group(1) if h.group(1) is not None else h.group(2) if h.group(2) is not None else h.group(3)
+        lhref = href.lower()
+        text = _TAG_RE.sub(b"", m.group(2)).lower()
+        if (
+            any(w in text for w in _LINK_TEXT_WORDS)
+            or href.endswith((b".txt", b".out"))
+            or b"/data/" in href
+            or b"output" in lhref
+        ):
+            return html.unescape(href.decode("utf-8", "replace"))
+    return None
+
+
+def is_data_row(line):
+    """
+    データ行（先頭が数値で MIN_DATA_COLS 列以上ある行）かどうか。line は str でも bytes でもよい。
+    IRIのデータ行は、例えば " 1800.0 15105 0.012 1030 3869 3869 23 8 900 68 0 0 -1 39.7 63" のように、
+    最初の数値（高度）の後に続くデータが豊富です。
+    """
+    parts = line.split()
+    if len(parts) < MIN_DATA_COLS:
+        return False
+    try:
+        float(parts[0])
+    except ValueError:
+        return False
+    return True
+
+
+def has_data_rows(content: bytes):
+    """content (bytes) に IRI のデータ行 (is_data_row) が1行でもあるか。"""
+    return any(is_data_row(line) for line in content.splitlines())
+
+
+def find_inline_output(content: bytes):
+    """
+    結果ページ (bytes) の <pre> に IRI の出力（データ行）がそのまま入っていれば、その文字列を返す。
+    無ければ None。これが見つかればダウンロードリンクを辿る GET を省ける。
+    """
+    if content.find(b"<pre") < 0 and content.find(b"<PRE") < 0:
+        return None
+    for m in _PRE_RE.finditer(content):
+        body = _TAG_RE.sub(b"", m.group(1))
+        if has_data_rows(body):
+            return html.unescape(body.decode("utf-8", "replace"))
+    return None
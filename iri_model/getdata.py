@@ -1,17 +1,28 @@
+import asyncio
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import numpy as np
-import os
 from datetime import datetime
 from erg_analysis.coordinate.geom2rmlatmlt import geom2rmlatmlt
 from common import time, display
 
-from ._downloader import run_iri_profile
-from ._getdata import extract_iri_profile_data
+from ._downloader import (
+    fetch_iri_profile_async, httpx, _warmup, _new_async_client, _new_session, _payload_values_many,
+    _fetch_iri_profile, _in_event_loop, _TRANSPORTS, _quit_driver,
+)
+from ._getdata import _parse_iri_text
 
 def getdata(
         times,
         rmlatmlt,
         res_alt=50, # altitude resolution
         info=True,
+        concurrency=8, # number of simultaneous requests to CCMC
+        use_cache=True, # reuse IRI outputs cached under ~/.cache/iri_model
+        dtype=np.float32, # dtype of the returned model values ('times' is always float64)
+        transport=None, # 'httpx' (asyncio) or 'requests' (thread pool); None: httpx if available
+        dedup_tolerance=0, # [s] times within the same bin (and same lon/lat to 1e-3 deg) share one IRI run
 ):
     """
     Return
@@ -27,6 +38,7 @@ def getdata(
         * 'O2+'
         * 'NO+'
     """
+    min_alt = 0
     max_alt = 2000
     if len(times) != len(rmlatmlt):
         display.error('The lengths of times and rmlatmlt must be same')
@@ -35,6 +47,12 @@ def getdata(
     if rmlatmlt.ndim != 2 and rmlatmlt.shape[1] != 3:
         display.error('rmlatmlt shape error')
         return
+
+    if transport is not None and transport not in _TRANSPORTS:
+        display.error(f'transport must be one of {_TRANSPORTS}')
+        return
+    if transport is None:
+        transport = 'httpx' if httpx is not None else 'requests'
     
     r = rmlatmlt[:, 0]
     mlat = rmlatmlt[:, 1]
@@ -50,55 +68,206 @@ def getdata(
     lon = np.fmod(lon + 360, 360) # longitude: [0, 360]
 
     dt_times = time.convert(times, frm='unix', into='datetime')
-    output_filename = '.temporal_iri_profile_output.txt'
-    dict_return = {
-        'times': [],
-        'altitude': [],
-        'Ne': [],
-        'O+': [],
-        'N+': [],
-        'H+': [],
-        'He+': [],
-        'O2+': [],
-        'NO+': [],
-    }
     vars = ['Ne', 'O+', 'N+', 'H+', 'He+', 'O2+', 'NO+']
 
-    start_time_loop = datetime.now()
-    for i in range(len(times)):
-        display.progress_bar(i, len(times), start_time_loop)
-        dt_times_i = dt_times[i]
-        lon_i = lon[i]
-        lat_i = lat[i]
-        alt_i = alt[i]
-        if np.isnan(alt_i):
-            continue
-        ret = run_iri_profile(
-            dt_times_i,
-            lon_i,
-            lat_i,
-            coord_type='geom',
-            output_filename=output_filename,
-            step_alt=res_alt,
-            info=info
+    # 各時刻の IRI 実行は互いに独立なので、まとめて並行に取得する（結果はメモリ上で受け取る）
+    indices = [i for i in range(len(times)) if not np.isnan(alt[i])]
+    # 出力は高度が有効な時刻の数だけ先に確保し、ループでは代入だけにする
+    # （unix 時刻は float32 では秒の精度が無いので、'times' だけは float64）
+    n_out = len(indices)
+    dict_return = {'times': np.full(n_out, np.nan, dtype=np.float64)}
+    for var in ['altitude'] + vars:
+        dict_return[var] = np.full(n_out, np.nan, dtype=dtype)
+    # 同期版にフォールバックした場合はこのセッションを共有する
+    session = _new_session(pool_connections=1, pool_maxsize=max(4, concurrency))
+    try:
+        # フォームページの GET・パースは全時刻で共通なので、並行に始める前に1度だけ行う
+        if indices:
+            _warmup(session, info=info)
+        # 送信する日時・座標の文字列はループの外でまとめて作る
+        payloads = _payload_values_many(
+            [dt_times[i] for i in indices], lon[indices], lat[indices],
+            min_alt=min_alt, max_alt=max_alt, step_alt=res_alt,
         )
-        if ret != 0:
-            display.warning('run_iri_profile failed')
-            return
-        dict_data = extract_iri_profile_data(output_filename)
-        dict_return['times'].append(times[i])
+        # 送信内容が同じ（dedup_tolerance > 0 なら時刻をその秒数で丸めて同じ）時刻は1度だけ取得する
+        groups = _group_payloads([dt_times[i] for i in indices], payloads, dedup_tolerance)
+        if info and len(groups) < n_out:
+            print(f'{n_out} points -> {len(groups)} unique IRI runs')
+        args = [
+            (dt_times[indices[ks[0]]], lon[indices[ks[0]]], lat[indices[ks[0]]], payloads[ks[0]])
+            for ks in groups
+        ]
+        fetch_kwargs = dict(
+            res_alt=res_alt, concurrency=concurrency, info=info, use_cache=use_cache,
+        )
+        if transport == 'requests' or _in_event_loop():
+            # Jupyter などイベントループの中からは asyncio.run が使えないので、スレッドで並行に取得する
+            # （requests のセッションは各スレッドが自分のものを使う）
+            contents = _fetch_all_threads(args, **fetch_kwargs)
+        else:
+            contents = asyncio.run(_fetch_all(args, session=session, **fetch_kwargs))
+    finally:
+        session.close()
+
+    # IRI の高度グリッドは min_alt から res_alt 刻みで固定なので、取り出す高度の番号は計算で求まる
+    n_levels = int((max_alt - min_alt) // res_alt) + 1
+    grid_top = (min_alt + (n_levels - 1) * res_alt) * 1e3 # [m]
+    group_of = np.empty(n_out, dtype=np.intp)
+    for g, ks in enumerate(groups):
+        group_of[ks] = g
+    parsed = {}
+    for k, i in enumerate(indices):
+        g = group_of[k]
+        if g not in parsed:
+            content = contents[g]
+            if content is None:
+                display.warning('run_iri_profile failed')
+                return
+            parsed[g] = _parse_iri_text(content.decode('utf-8', 'replace'), dtype=dtype)
+            if parsed[g] is None:
+                display.warning('IRI output could not be parsed')
+                return
+        dict_data = parsed[g]
+        alt_i = alt[i]
+        dict_return['times'][k] = times[i]
         alt_data = dict_data['altitude']
-        idx_to_get = np.argmin(np.abs(alt_data - alt[i]))
-        dict_return['altitude'].append(alt_i)
+        if (
+            len(alt_data) == n_levels
+            and np.isclose(alt_data[0], min_alt * 1e3)
+            and np.isclose(alt_data[-1], grid_top)
+        ):
+            # 丁度中間の高度では np.argmin と同じく下側の高度を選ぶ（round は偶数側に丸めるので使わない）
+            idx_to_get = math.ceil((alt_i * 1e-3 - min_alt) / res_alt - 0.5)
+            idx_to_get = min(max(idx_to_get, 0), n_levels - 1)
+        else:
+            # 想定と違うグリッドが返ってきた場合は、最も近い高度を探す
+            idx_to_get = _nearest_index(alt_data, alt_i)
+        dict_return['altitude'][k] = alt_i
         for var in vars:
-            dict_return[var].append(dict_data[var][idx_to_get])
-    
-    # list -> ndarray
-    for var in dict_return.keys():
-        dict_return[var] = np.array(dict_return[var])
+            dict_return[var][k] = dict_data[var][idx_to_get]
 
-    # delete temporal file
-    os.remove(output_filename)
-    print(f'Deleted temporal file: {output_filename}')
-    
     return dict_return
+
+
+def _fetch_all_threads(args, res_alt, concurrency, info, use_cache=True):
+    """
+    _fetch_all のスレッド版（requests は通信待ちの間 GIL を離すので、I/O はスレッドでも重なる）。
+    結果は args と同じ順で返す。Cookie はスレッドセーフでないので、requests のセッションは
+    run_iri_profile_batch と同じく各スレッドが自分専用のものを作って使い回し、最後に閉じる。
+    Selenium へのフォールバックは1スレッドずつ行い、使った Chrome はその都度終了する
+    （各スレッドが Chrome を起動したまま残さないように）。
+    """
+    selenium_lock = threading.Lock()
+    local = threading.local()
+    sessions = []
+    sessions_lock = threading.Lock()
+
+    def _fetch_one(*fetch_args, **fetch_kwargs):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = _new_session(pool_connections=1, pool_maxsize=4)
+            with sessions_lock:
+                sessions.append(session)
+        return _fetch_iri_profile(*fetch_args, session=session, **fetch_kwargs)
+
+    contents = [None] * len(args)
+    start_time_loop = datetime.now()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {
+                executor.submit(
+                    _fetch_one,
+                    dt_times_i,
+                    lon_i,
+                    lat_i,
+                    coord_type='geom',
+                    step_alt=res_alt,
+                    info=info,
+                    use_cache=use_cache,
+                    prebuilt_payload=payload_i,
+                    keep_driver=False,
+                    selenium_lock=selenium_lock,
+                ): k
+                for k, (dt_times_i, lon_i, lat_i, payload_i) in enumerate(args)
+            }
+            for n_done, future in enumerate(as_completed(futures)):
+                contents[futures[future]] = future.result()
+                display.progress_bar(n_done, len(args), start_time_loop)
+    finally:
+        for session in sessions:
+            session.close()
+    return contents
+
+
+def _group_payloads(dt_times, payloads, dedup_tolerance=0):
+    """
+    送信内容が同じになる要素の番号をまとめたリストのリストを返す（最初に現れた順）。
+    dedup_tolerance > 0 [s] なら、時刻をその幅で丸めたものが同じなら同じとみなす
+    （取得にはグループの最初の要素の時刻を使う）。
+    """
+    groups = {}
+    for k, (dt, payload) in enumerate(zip(dt_times, payloads)):
+        if dedup_tolerance > 0:
+            t_key = round(dt.timestamp() / dedup_tolerance)
+        else:
+            t_key = tuple(payload[key] for key in ('Year', 'Month', 'Day', 'Hour', 'Minute', 'Second'))
+        groups.setdefault((t_key, payload['Longitude'], payload['Latitude']), []).append(k)
+    return list(groups.values())
+
+
+def _nearest_index(grid, value):
+    """昇順の grid のうち value に最も近い要素の番号 (np.searchsorted で両隣だけ比べる)"""
+    j = int(np.searchsorted(grid, value))
+    if j <= 0:
+        return 0
+    if j >= len(grid):
+        return len(grid) - 1
+    return j if grid[j] - value < value - grid[j - 1] else j - 1
+
+
+async def _fetch_all(args, res_alt, concurrency, session, info, use_cache=True):
+    """
+    args の各 (datetime, lon, lat, payload) について IRI 出力 (bytes) を並行に取得し、args と同じ順で返す。
+    取得に失敗した要素は None。同時に投げるリクエストは concurrency 個まで。
+    use_cache=True なら、以前に取得した同じパラメータの出力はディスクのキャッシュから返す
+    （use_cache=False なら再取得してキャッシュを更新する）。
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    contents = [None] * len(args)
+    n_done = 0
+    start_time_loop = datetime.now()
+
+    async def _fetch_one(k, client, dt_times_i, lon_i, lat_i, payload_i):
+        nonlocal n_done
+        async with semaphore:
+            contents[k] = await fetch_iri_profile_async(
+                dt_times_i,
+                lon_i,
+                lat_i,
+                coord_type='geom',
+                step_alt=res_alt,
+                info=info,
+                client=client,
+                session=session,
+                use_cache=use_cache,
+                prebuilt_payload=payload_i,
+                fallback_executor=fallback_executor,
+            )
+        display.progress_bar(n_done, len(args), start_time_loop)
+        n_done += 1
+
+    client = _new_async_client() if httpx is not None else None
+    # httpx で失敗した分の同期版（requests・Selenium）は1スレッドで順に実行する
+    # （Chrome が concurrency 個起動したり、requests のセッションを複数スレッドで共有したりしないように）
+    fallback_executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        async with asyncio.TaskGroup() as tg:
+            for k, arg in enumerate(args):
+                tg.create_task(_fetch_one(k, client, *arg))
+    finally:
+        if client is not None:
+            await client.aclose()
+        # そのスレッドが起動した Chrome を終了してから、スレッドを止める
+        await asyncio.get_running_loop().run_in_executor(fallback_executor, _quit_driver)
+        fallback_executor.shutdown()
+    return contents